@@ -48,6 +48,8 @@ class Alternating(BaseModel):
 
     """
 
+    _vectorized = True
+
     def __init__(self, parameters={}):
         BaseModel.__init__(self)
         self.all_required_parameters = {'threshold': 5, 't1': 1,
@@ -57,14 +59,20 @@ class Alternating(BaseModel):
                                'predictors': ['temperature', 'doy_series']}
 
     def _apply_model(self, temperature, doy_series, a, b, c, threshold, t1):
-        chill_days = ((temperature < threshold) * 1).copy()
-        chill_days[doy_series < t1] = 0
+        if utils.kernels.use_kernels(temperature, a, b, c, threshold, t1):
+            return utils.kernels.alternating(temperature, doy_series, a=a, b=b, c=c,
+                                             threshold=threshold, t1=t1)
+
+        below_threshold = temperature < threshold
+
+        # Chill days and growing degree days both only accumulate after t1
+        chill_days = below_threshold * 1
+        chill_days = utils.transforms.zero_before_doy(chill_days, doy_series, t1)
         chill_days = utils.transforms.forcing_accumulator(chill_days)
 
         # Accumulated growing degree days from Jan 1
-        gdd = temperature.copy()
-        gdd[gdd < threshold] = 0
-        gdd[doy_series < t1] = 0
+        gdd = np.where(below_threshold, 0, temperature)
+        gdd = utils.transforms.zero_before_doy(gdd, doy_series, t1)
         gdd = utils.transforms.forcing_accumulator(gdd)
 
         # Phenological event happens the first day gdd is > chill_day curve
@@ -125,6 +133,8 @@ class MSB(BaseModel):
 
     """
 
+    _vectorized = True
+
     def __init__(self, parameters={}):
         BaseModel.__init__(self)
         self.all_required_parameters = {'threshold': 5, 't1': 1, 'd': (-100, 100),
@@ -134,14 +144,16 @@ class MSB(BaseModel):
                                'predictors': ['temperature', 'doy_series']}
 
     def _apply_model(self, temperature, doy_series, a, b, c, d, threshold, t1):
-        chill_days = ((temperature < threshold) * 1).copy()
-        chill_days[doy_series < t1] = 0
+        below_threshold = temperature < threshold
+
+        # Chill days and growing degree days both only accumulate after t1
+        chill_days = below_threshold * 1
+        chill_days = utils.transforms.zero_before_doy(chill_days, doy_series, t1)
         chill_days = utils.transforms.forcing_accumulator(chill_days)
 
         # Accumulated growing degree days from Jan 1
-        gdd = temperature.copy()
-        gdd[gdd < threshold] = 0
-        gdd[doy_series < t1] = 0
+        gdd = np.where(below_threshold, 0, temperature)
+        gdd = utils.transforms.zero_before_doy(gdd, doy_series, t1)
         gdd = utils.transforms.forcing_accumulator(gdd)
 
         chill_day_curve = a + b * np.exp(c * chill_days)
@@ -150,9 +162,9 @@ class MSB(BaseModel):
         # for easy addition.
         mean_spring_temp = utils.transforms.mean_temperature(temperature, doy_series,
                                                              start_doy=1, end_doy=60)
-        mean_spring_temp *= d
+        mean_spring_temp = mean_spring_temp * d
         # Add in correction based on per site spring temperature
-        chill_day_curve += mean_spring_temp
+        chill_day_curve = chill_day_curve + mean_spring_temp
 
         # Phenological event happens the first day gdd is > chill_day curve
         difference = gdd - chill_day_curve
@@ -2,22 +2,39 @@ import numpy as np
 import pandas as pd
 from . import utils, validation
 import time
+import numbers
 from collections import OrderedDict
 from warnings import warn
-from copy import deepcopy
 
 
 class BaseModel():
+    # Models which can evaluate many parameter sets at once by broadcasting
+    # them along a trailing axis of the temperature array. See
+    # _scipy_error_vectorized()
+    _vectorized = False
+
+    # Upper limit on the number of array elements used per chunk of
+    # candidates in _scipy_error_vectorized()
+    _vectorized_max_elements = 2**22
+
+    # Models whose _apply_model() accepts a temperature_lookup argument, see
+    # utils.transforms.temperature_lookup(). It is added to the
+    # fitting predictors since they are evaluated many times, unless
+    # the compiled kernels are available.
+    _temperature_lookup = False
+
     def __init__(self):
         self._fitted_params = {}
         self.obs_fitting = None
         self.temperature_fitting = None
         self.doy_series = None
         self.debug = False
+        # Final population from the last DE fit, used with warm_start
+        self._last_population = None
 
     def fit(self, observations, predictors, loss_function='rmse',
             method='DE', optimizer_params='practical',
-            verbose=False, debug=False, **kwargs):
+            verbose=False, debug=False, warm_start=False, **kwargs):
         """Estimate the parameters of a model
 
         Parameters:
@@ -40,7 +57,11 @@ class BaseModel():
 
             optimizer_params : dict | str
                 Arguments for the scipy optimizer, or one of 3 presets 'testing',
-                'practical', or 'intensive'.
+                'practical', or 'intensive'. With method 'DE' setting 'workers'
+                (eg. -1 for all cores) evaluates the population in parallel,
+                and setting 'vectorized' to True evaluates the entire
+                population (or with method 'BF' the entire grid) in a
+                single call.
 
             verbose : bool
                 display progress of the optimizer
@@ -48,6 +69,14 @@ class BaseModel():
             debug : bool
                 display various internals
 
+            warm_start : bool
+                With method 'DE', start from the final population of the
+                previous fit of this model instead of a new random one.
+                Refitting to similar data then converges in far fewer
+                iterations. Ignored if 'init' is set in optimizer_params,
+                and ignored with a warning if there is no previous population.
+                The population is only available with scipy 1.10 or later.
+
         """
 
         validation.validate_predictors(predictors, self._required_data['predictor_columns'])
@@ -59,32 +88,64 @@ class BaseModel():
         self._organize_predictors(predictors=predictors,
                                   observations=observations,
                                   for_prediction=False)
+        # Everything passed to _apply_model() in _scipy_error() besides
+        # the parameters being estimated
+        self._fitting_arguments = dict(self.fitting_predictors, **self._fixed_parameters)
 
         if debug:
             verbose = True
             self.debug = True
             self.model_timings = []
+            # Any _apply_model() which modifies the predictor arrays in
+            # place would change them for every following candidate, so
+            # make that an immediate error.
+            for name, value in self._fitting_arguments.items():
+                if isinstance(value, np.ndarray):
+                    read_only_value = value.view()
+                    read_only_value.flags.writeable = False
+                    self._fitting_arguments[name] = read_only_value
             print('estimating params:\n {x} \n '.format(x=self._parameters_to_estimate))
             print('array passed to optimizer:\n {x} \n'.format(x=self._scipy_bounds()))
             print('fixed params:\n {x} \n '.format(x=self._fixed_parameters))
         if verbose:
             fitting_start = time.time()
 
-        self._fitted_params = utils.optimize.fit_parameters(function_to_minimize=self._scipy_error,
-                                                            bounds=self._scipy_bounds(),
-                                                            method=method,
-                                                            results_translator=self._translate_scipy_parameters,
-                                                            optimizer_params=optimizer_params,
-                                                            verbose=verbose)
+        # A warm start replaces the init of the presets, but not one set explicitly
+        init_is_set = isinstance(optimizer_params, dict) and 'init' in optimizer_params
+        if warm_start and method == 'DE' and not init_is_set:
+            if self._last_population is not None and \
+               self._last_population.shape[1] == len(self._parameters_to_estimate):
+                optimizer_params = dict(utils.optimize.validate_optimizer_parameters(optimizer_method=method,
+                                                                                     optimizer_params=optimizer_params))
+                optimizer_params['init'] = self._last_population
+            else:
+                # Older scipy versions do not return the final DE population,
+                # so there is never anything to start from.
+                warn('warm_start ignored, there is no population from a previous DE fit ' +
+                     'of this model. This requires scipy >= 1.10')
+
+        self._fitted_params, optimize_output = utils.optimize.fit_parameters(function_to_minimize=self._scipy_error,
+                                                                             vectorized_function=self._scipy_error_vectorized,
+                                                                             bounds=self._scipy_bounds(),
+                                                                             method=method,
+                                                                             results_translator=self._translate_scipy_parameters,
+                                                                             optimizer_params=optimizer_params,
+                                                                             verbose=verbose,
+                                                                             full_output=True)
+        if method == 'DE':
+            self._last_population = optimize_output.get('population')
         if verbose:
             total_fit_time = round(time.time() - fitting_start, 5)
             print('Total model fitting time: {s} sec.\n'.format(s=total_fit_time))
 
         if debug:
+            # With parallel workers the timings are recorded in the worker
+            # processes and never make it back here.
             n_runs = len(self.model_timings)
-            mean_time = np.mean(self.model_timings).round(5)
-            print('Model iterations: {n}'.format(n=n_runs))
-            print('Mean timing: {t} sec/iteration \n\n'.format(t=mean_time))
+            if n_runs > 0:
+                mean_time = np.mean(self.model_timings).round(5)
+                print('Model iterations: {n}'.format(n=n_runs))
+                print('Mean timing: {t} sec/iteration \n\n'.format(t=mean_time))
             self.debug = False
         self._fitted_params.update(self._fixed_parameters)
 
@@ -152,8 +213,7 @@ class BaseModel():
                             'must both be pandas dataframes of new data to predict,' +
                             'or set to None to predict the data used for fitting')
 
-        predictions = self._apply_model(**deepcopy(predictors),
-                                        **self._fitted_params)
+        predictions = self._apply_model(**predictors, **self._fitted_params)
 
         return predictions
 
@@ -191,6 +251,10 @@ class BaseModel():
                                                                                                           for_prediction=for_prediction)
             self.fitting_predictors = {'temperature': temperature_fitting,
                                        'doy_series': doy_series}
+            # The compiled kernels never use the lookup, so only build
+            # it when fitting will use the numpy implementations.
+            if self._temperature_lookup and not utils.kernels.available():
+                self.fitting_predictors['temperature_lookup'] = utils.transforms.temperature_lookup(temperature_fitting)
             self.obs_fitting = cleaned_observations
 
     def _validate_formatted_predictors(self, predictors):
@@ -211,6 +275,8 @@ class BaseModel():
         if len(doy_series) != temp.shape[0]:
             raise ValueError('temp axis 0 does not match doy_series')
 
+        validation.validate_doy_series(doy_series)
+
         if len(temp.shape) == 2:
             if np.any(np.isnan(temp)):
                 raise ValueError('Nan values in temp array')
@@ -246,7 +312,7 @@ class BaseModel():
                                                                                    b=type(self).__name__))
             # all parameters that were saved should be fixed numeric values
             for parameter, value in passed_parameters.items():
-                if not isinstance(value * 1.0, float):
+                if not isinstance(value, numbers.Real):
                     raise TypeError('Expected a set value for parameter {p} in saved file, got {v}'.format(p=parameter, v=value))
         else:
             if not isinstance(passed_parameters, dict):
@@ -269,13 +335,15 @@ class BaseModel():
             elif isinstance(value, slice):
                 # Note: Slices valid for brute force method only.
                 parameters_to_estimate[parameter] = value
-            elif isinstance(value * 1.0, float):
+            elif isinstance(value, numbers.Real):
                 fixed_parameters[parameter] = value
             else:
                 raise TypeError('unkown parameter value: ' + str(type(value)) + ' for ' + parameter)
 
         self._parameters_to_estimate = OrderedDict(parameters_to_estimate)
         self._fixed_parameters = OrderedDict(fixed_parameters)
+        self._estimated_parameter_names = tuple(parameters_to_estimate)
+        self._estimated_parameter_bounds = tuple(parameters_to_estimate.values())
 
         # If nothing to estimate then all parameters have been
         # passed as fixed values and no fitting is needed
@@ -324,20 +392,14 @@ class BaseModel():
         """Map parameters from a 1D array to a dictionary for
         use in phenology model functions. Ordering matters
         in unpacking the scipy_array since it isn't labeled. Thus
-        it relies on self._parameters_to_estimate being an 
-        OrdereddDict
+        it relies on self._estimated_parameter_names having the
+        same order as self._parameters_to_estimate
         """
         # If only a single value is being fit, some scipy.
         # optimizer methods will use a single
         # value instead of list of length 1.
-        try:
-            _ = parameters_array[0]
-        except IndexError:
-            parameters_array = [parameters_array]
-        labeled_parameters = {}
-        for i, (param, value) in enumerate(self._parameters_to_estimate.items()):
-            labeled_parameters[param] = parameters_array[i]
-        return labeled_parameters
+        parameters_array = np.atleast_1d(parameters_array)
+        return dict(zip(self._estimated_parameter_names, parameters_array))
 
     def _scipy_error(self, x):
         """Error function for use within scipy.optimize functions.
@@ -347,24 +409,68 @@ class BaseModel():
         x, labels it appropriately to be used as **parameters to the
         internal phenology model, and adds any fixed parameters.
         """
-        parameters = self._translate_scipy_parameters(x)
-
-        # add any fixed parameters
-        parameters.update(self._fixed_parameters)
+        # This is called for every candidate during fitting, so the
+        # predictors and fixed parameters are combined ahead of time in fit().
+        # x always has one value per parameter here, unlike in
+        # _translate_scipy_parameters() which also handles optimizer results.
+        arguments = self._fitting_arguments.copy()
+        arguments.update(zip(self._estimated_parameter_names, x))
 
         if self.debug:
-            start = time.time()
+            start = time.perf_counter()
 
-        doy_estimates = self._apply_model(**deepcopy(self.fitting_predictors),
-                                          **parameters)
+        doy_estimates = self._apply_model(**arguments)
         if self.debug:
-            self.model_timings.append(time.time() - start)
+            self.model_timings.append(time.perf_counter() - start)
 
         return self.loss_function(self.obs_fitting, doy_estimates)
 
+    def _scipy_error_vectorized(self, x):
+        """Error function for scipy.optimize.differential_evolution when
+        using vectorized=True.
+
+        Here x is a (n_parameters, S) array of S candidate parameter sets,
+        and the error for each of them is returned in a 1D array of length S.
+        Models with _vectorized set evaluate the candidates by adding a
+        trailing axis to the temperature array, which the parameters then
+        broadcast against. This is done in chunks to limit memory usage.
+        All other models are evaluated one candidate at a time.
+        """
+        if not self._vectorized:
+            return np.array([self._scipy_error(candidate) for candidate in x.T])
+
+        fitting_arguments = self._fitting_arguments.copy()
+        fitting_arguments['temperature'] = fitting_arguments['temperature'][..., np.newaxis]
+
+        n_candidates = x.shape[1]
+        chunk_size = max(1, self._vectorized_max_elements // fitting_arguments['temperature'].size)
+        n_chunks = int(np.ceil(n_candidates / chunk_size))
+
+        errors = []
+        for candidates in np.array_split(x, n_chunks, axis=1):
+            arguments = fitting_arguments.copy()
+            arguments.update(zip(self._estimated_parameter_names, candidates))
+
+            if self.debug:
+                start = time.perf_counter()
+
+            # doy_estimates is (n_obs, n_candidates)
+            doy_estimates = self._apply_model(**arguments)
+
+            if self.debug:
+                self.model_timings.append(time.perf_counter() - start)
+
+            if self.loss_function in utils.optimize.broadcastable_loss_functions:
+                errors.extend(self.loss_function(self.obs_fitting[:, np.newaxis], doy_estimates))
+            else:
+                errors.extend([self.loss_function(self.obs_fitting, candidate_estimates)
+                               for candidate_estimates in doy_estimates.T])
+
+        return np.array(errors)
+
     def _scipy_bounds(self):
         """Bounds structured for scipy.optimize input"""
-        return [bounds for param, bounds in list(self._parameters_to_estimate.items())]
+        return self._estimated_parameter_bounds
 
     def _parameters_are_set(self):
         """True if all parameters have been set from fitting or loading at initialization"""
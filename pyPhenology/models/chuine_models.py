@@ -1,3 +1,4 @@
+import numpy as np
 from . import utils
 from .base import BaseModel
 
@@ -42,6 +43,9 @@ class Uniforc(BaseModel):
 
     """
 
+    _vectorized = True
+    _temperature_lookup = True
+
     def __init__(self, parameters={}):
         BaseModel.__init__(self)
         self.all_required_parameters = {'t1': (-67, 298), 'F': (0, 200), 'b': (-20, 0), 'c': (-50, 50)}
@@ -49,11 +53,14 @@ class Uniforc(BaseModel):
         self._required_data = {'predictor_columns': ['site_id', 'year', 'doy', 'temperature'],
                                'predictors': ['temperature', 'doy_series']}
 
-    def _apply_model(self, temperature, doy_series, t1, F, b, c):
-        temperature = utils.transforms.sigmoid2(temperature, b=b, c=c)
+    def _apply_model(self, temperature, doy_series, t1, F, b, c, temperature_lookup=None):
+        if utils.kernels.use_kernels(temperature, t1, F, b, c):
+            return utils.kernels.uniforc(temperature, doy_series, t1=t1, F=F, b=b, c=c)
+
+        temperature = utils.transforms.sigmoid2(temperature, b=b, c=c, lookup=temperature_lookup)
 
         # Only accumulate forcing after t1
-        temperature[doy_series < t1] = 0
+        temperature = utils.transforms.zero_before_doy(temperature, doy_series, t1)
 
         accumulateed_forcing = utils.transforms.forcing_accumulator(temperature)
 
@@ -110,6 +117,9 @@ class Unichill(BaseModel):
 
     """
 
+    _vectorized = True
+    _temperature_lookup = True
+
     def __init__(self, parameters={}):
         BaseModel.__init__(self)
         self.all_required_parameters = {'t0': (-67, 298), 'C': (0, 300), 'F': (0, 200),
@@ -119,23 +129,24 @@ class Unichill(BaseModel):
         self._required_data = {'predictor_columns': ['site_id', 'year', 'doy', 'temperature'],
                                'predictors': ['temperature', 'doy_series']}
 
-    def _apply_model(self, temperature, doy_series, t0, C, F, b_f, c_f, a_c, b_c, c_c):
-        if len(temperature.shape) > 2:
-            raise NotImplementedError('Unichill model currently only supports 2d temperature arrays')
-
-        temp_chilling = temperature.copy()
-        temp_forcing = temperature.copy()
+    def _apply_model(self, temperature, doy_series, t0, C, F, b_f, c_f, a_c, b_c, c_c,
+                     temperature_lookup=None):
+        if utils.kernels.use_kernels(temperature, t0, C, F, b_f, c_f, a_c, b_c, c_c):
+            return utils.kernels.unichill(temperature, doy_series, t0=t0, C=C, F=F,
+                                          b_f=b_f, c_f=c_f, a_c=a_c, b_c=b_c, c_c=c_c)
 
-        temp_forcing = utils.transforms.sigmoid2(temp_forcing, b=b_f, c=c_f)
-        temp_chilling = utils.transforms.sigmoid3(temp_chilling, a=a_c, b=b_c, c=c_c)
+        temp_forcing = utils.transforms.sigmoid2(temperature, b=b_f, c=c_f,
+                                                 lookup=temperature_lookup)
+        temp_chilling = utils.transforms.sigmoid3(temperature, a=a_c, b=b_c, c=c_c,
+                                                  lookup=temperature_lookup)
 
         # Only accumulate chilling after t0
-        temp_chilling[doy_series < t0] = 0
+        temp_chilling = utils.transforms.zero_before_doy(temp_chilling, doy_series, t0)
 
         # forcing (heat) accumulation starts once chilling requirement (C)
         # has been met
         chill_requirement_not_met = utils.transforms.forcing_accumulator(temp_chilling) < C
-        temp_forcing[chill_requirement_not_met] = 0
+        temp_forcing = np.where(chill_requirement_not_met, 0, temp_forcing)
 
         accumulated_forcing = utils.transforms.forcing_accumulator(temp_forcing)
 
@@ -4,8 +4,33 @@ from ..utils import load_model, load_model_parameters
 from . import validation
 from copy import deepcopy
 import warnings
+from contextlib import contextmanager
+from multiprocessing import Pool
 from joblib import Parallel, delayed
 
+
+@contextmanager
+def shared_workers_pool(n_jobs, fit_kwargs):
+    """Share a single process pool among all the core model fits.
+
+    With the DE optimizer, workers (eg. -1) has scipy start a new pool of
+    processes for every model fit. When core models are fit one at a time
+    (n_jobs=1) a single pool is created here instead, and its map function
+    is passed as workers to every fit.
+
+    Yields the fit kwargs to use.
+    """
+    optimizer_params = fit_kwargs.get('optimizer_params')
+    workers = optimizer_params.get('workers', 1) if isinstance(optimizer_params, dict) else 1
+    if n_jobs != 1 or not isinstance(workers, int) or workers == 1:
+        yield fit_kwargs
+        return
+
+    with Pool(None if workers == -1 else workers) as pool:
+        fit_kwargs = dict(fit_kwargs)
+        fit_kwargs['optimizer_params'] = dict(optimizer_params, workers=pool.map)
+        yield fit_kwargs
+
 class EnsembleBase():
     def __init__(self):
         pass
@@ -180,7 +205,9 @@ class BootstrapModel(EnsembleBase):
                 pandas dataframe of associated predictors
 
             n_jobs : int
-                number of parallel processes to use
+                number of parallel processes to use. With n_jobs=1 and the DE
+                optimizer_params workers option set, all bootstraps share
+                a single pool of worker processes.
 
             kwargs :
                 Other arguments passed to core model fitting (eg. optimzer methods)
@@ -188,7 +215,8 @@ class BootstrapModel(EnsembleBase):
         self.observations = observations
         self.predictors = predictors
         
-        self.model_list = Parallel(n_jobs = n_jobs)(delayed(self._fit_job)(m, **kwargs) for m in self.model_list)
+        with shared_workers_pool(n_jobs, kwargs) as kwargs, utils.misc.cached_temperature_pivot():
+            self.model_list = Parallel(n_jobs = n_jobs)(delayed(self._fit_job)(m, **kwargs) for m in self.model_list)
 
     def predict(self, to_predict=None, predictors=None, 
                 aggregation='mean', n_jobs=1, **kwargs):
@@ -223,19 +251,20 @@ class BootstrapModel(EnsembleBase):
 
         # If the models within this ensemble are themselves ensembles,
         # then let those models do the parallel stuff.
-        if isinstance(self.model_list[0], EnsembleBase):
-            predictions = []
-            for m in self.model_list:
-                predictions.append(m.predict(to_predict = to_predict,
-                                             predictors = predictors,
-                                             aggregation = aggregation,
-                                             n_jobs = n_jobs,
-                                             **kwargs))
-        else:
-            predictions = Parallel(n_jobs = n_jobs)(delayed(self._predict_job)
-                (m, to_predict = to_predict, predictors = predictors, 
-                 aggregation=aggregation, **kwargs)
-                for m in self.model_list)
+        with utils.misc.cached_temperature_pivot():
+            if isinstance(self.model_list[0], EnsembleBase):
+                predictions = []
+                for m in self.model_list:
+                    predictions.append(m.predict(to_predict = to_predict,
+                                                 predictors = predictors,
+                                                 aggregation = aggregation,
+                                                 n_jobs = n_jobs,
+                                                 **kwargs))
+            else:
+                predictions = Parallel(n_jobs = n_jobs)(delayed(self._predict_job)
+                    (m, to_predict = to_predict, predictors = predictors, 
+                     aggregation=aggregation, **kwargs)
+                    for m in self.model_list)
 
         predictions = np.array(predictions)
         if aggregation == 'mean':
@@ -355,7 +384,8 @@ class Ensemble(EnsembleBase):
         self.observations = observations
         self.predictors = predictors
 
-        self.model_list = Parallel(n_jobs = n_jobs)(delayed(self._fit_job)(m, **kwargs) for m in self.model_list)
+        with utils.misc.cached_temperature_pivot():
+            self.model_list = Parallel(n_jobs = n_jobs)(delayed(self._fit_job)(m, **kwargs) for m in self.model_list)
 
     def predict(self, to_predict=None, predictors=None, 
                 aggregation='mean', n_jobs=1, **kwargs):
@@ -381,19 +411,20 @@ class Ensemble(EnsembleBase):
 
         # If the models within this ensemble are themselves ensembles,
         # then let those models do the parallel stuff.
-        if isinstance(self.model_list[0], EnsembleBase):
-            predictions = []
-            for m in self.model_list:
-                predictions.append(m.predict(to_predict = to_predict,
-                                             predictors = predictors,
-                                             aggregation = aggregation,
-                                             n_jobs = n_jobs,
-                                             **kwargs))
-        else:
-            predictions = Parallel(n_jobs = n_jobs)(delayed(self._predict_job)
-                (m, to_predict = to_predict, predictors = predictors, 
-                 aggregation=aggregation, **kwargs)
-                for m in self.model_list)
+        with utils.misc.cached_temperature_pivot():
+            if isinstance(self.model_list[0], EnsembleBase):
+                predictions = []
+                for m in self.model_list:
+                    predictions.append(m.predict(to_predict = to_predict,
+                                                 predictors = predictors,
+                                                 aggregation = aggregation,
+                                                 n_jobs = n_jobs,
+                                                 **kwargs))
+            else:
+                predictions = Parallel(n_jobs = n_jobs)(delayed(self._predict_job)
+                    (m, to_predict = to_predict, predictors = predictors, 
+                     aggregation=aggregation, **kwargs)
+                    for m in self.model_list)
 
         predictions = np.array(predictions)
         if aggregation == 'mean':
@@ -556,7 +587,7 @@ class WeightedEnsemble(EnsembleBase):
         weight_bounds = [(1,10)] * len(self.model_list)
         translate_scipy_weights = lambda w: np.array(w)
         
-        with Parallel(n_jobs = n_jobs) as parallel:
+        with Parallel(n_jobs = n_jobs) as parallel, utils.misc.cached_temperature_pivot():
             for i in range(iterations):
                 held_out_observations = self.observations.sample(frac=held_out_percent,
                                                                  replace=False)
@@ -633,10 +664,11 @@ class WeightedEnsemble(EnsembleBase):
             predictors = self.predictors
             to_predict = self.observations
 
-        predictions = Parallel(n_jobs = n_jobs)(delayed(self._predict_job)
-            (m, to_predict = to_predict, predictors = predictors,
-             aggregation=aggregation, **kwargs)
-            for m in self.model_list)
+        with utils.misc.cached_temperature_pivot():
+            predictions = Parallel(n_jobs = n_jobs)(delayed(self._predict_job)
+                (m, to_predict = to_predict, predictors = predictors,
+                 aggregation=aggregation, **kwargs)
+                for m in self.model_list)
 
         predictions = np.array(predictions)
 
@@ -1,3 +1,4 @@
+import numpy as np
 from . import utils
 from .base import BaseModel
 
@@ -54,13 +55,17 @@ class Sequential(BaseModel):
             to_return[:] = 9999
             return to_return
 
-        chill_days = utils.transforms.triangle_response(temperature.copy(), t_min=c_t_min,
-                                                        t_opt=c_t_opt, t_max=c_t_max)
-        chill_days[doy_series < t0] = 0
+        if utils.kernels.use_kernels(temperature, c_t_min, c_t_opt, c_t_max):
+            chill_days = utils.kernels.triangle_response(temperature, t_min=c_t_min,
+                                                         t_opt=c_t_opt, t_max=c_t_max)
+        else:
+            chill_days = utils.transforms.triangle_response(temperature, t_min=c_t_min,
+                                                            t_opt=c_t_opt, t_max=c_t_max)
+        chill_days = utils.transforms.zero_before_doy(chill_days, doy_series, t0)
         chill_days = utils.transforms.forcing_accumulator(chill_days)
 
         # Where adequate chill has not yet accumulated
-        temperature[chill_days < C] = 0
+        temperature = np.where(chill_days < C, 0, temperature)
         # Warming threshold temperature
         temperature[temperature < f_t] = 0
 
@@ -1,4 +1,4 @@
-from . import utils
+from . import utils, validation
 from .base import BaseModel
 import numpy as np
 
@@ -34,6 +34,8 @@ class ThermalTime(BaseModel):
 
     """
 
+    _vectorized = True
+
     def __init__(self, parameters={}):
         BaseModel.__init__(self)
         self.all_required_parameters = {'t1': (-67, 298), 'T': (-25, 25), 'F': (0, 1000)}
@@ -43,10 +45,10 @@ class ThermalTime(BaseModel):
 
     def _apply_model(self, temperature, doy_series, t1, T, F):
         # Temperature threshold
-        temperature[temperature < T] = 0
+        temperature = np.where(temperature < T, 0, temperature)
 
         # Only accumulate forcing after t1
-        temperature[doy_series < t1] = 0
+        temperature = utils.transforms.zero_before_doy(temperature, doy_series, t1)
 
         accumulated_gdd = utils.transforms.forcing_accumulator(temperature)
 
@@ -130,14 +132,14 @@ class M1(BaseModel):
             self.obs_fitting = cleaned_observations
 
     def _validate_formatted_predictors(self, predictors):
-        pass
+        validation.validate_doy_series(predictors['doy_series'])
 
     def _apply_model(self, temperature, doy_series, daylength, t1, T, F, k):
         # Temperature threshold
-        temperature[temperature < T] = 0
+        temperature = np.where(temperature < T, 0, temperature)
 
         # Only accumulate forcing after t1
-        temperature[doy_series < t1] = 0
+        temperature = utils.transforms.zero_before_doy(temperature, doy_series, t1)
 
         accumulated_gdd = utils.transforms.forcing_accumulator(temperature)
 
@@ -192,6 +194,8 @@ class FallCooling(BaseModel):
 
     """
 
+    _vectorized = True
+
     def __init__(self, parameters={}):
         BaseModel.__init__(self)
         self.all_required_parameters = {'t1': (182, 365), 'T': (-25, 25), 'F': (0, 1000)}
@@ -201,10 +205,10 @@ class FallCooling(BaseModel):
 
     def _apply_model(self, temperature, doy_series, t1, T, F):
         # Temperature threshold
-        temperature[temperature > T] = 0
+        temperature = np.where(temperature > T, 0, temperature)
 
         # Only accumulate forcing after t1
-        temperature[doy_series < t1] = 0
+        temperature = utils.transforms.zero_before_doy(temperature, doy_series, t1)
 
         accumulated_gdd = utils.transforms.forcing_accumulator(temperature)
 
@@ -1,3 +1,4 @@
 from . import transforms
 from . import optimize
 from . import misc
+from . import kernels
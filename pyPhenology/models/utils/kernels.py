@@ -0,0 +1,283 @@
+"""Compiled versions of model internals.
+
+The numpy implementation of a model makes several passes over the full
+(doy, obs) temperature array: thresholds, masks, cumulative sums, and
+finally doy_estimator(). When numba is installed these kernels do all of
+that in a single pass over each timeseries, stopping once the event happens.
+Without numba the models use the numpy implementations.
+
+The kernels are single threaded. Parallelism comes from the DE workers
+option or the ensemble n_jobs option, and numba's threading layer is not
+safe to use in processes forked from one where it is already running.
+Compiled kernels are cached on disk, so only the first import in a new
+environment pays the compilation time.
+"""
+import numpy as np
+from contextlib import contextmanager
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    # Allow the kernels below to still be defined. They are never
+    # used since models check use_kernels() first.
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+_enabled = True
+
+
+@contextmanager
+def disabled():
+    """Use the numpy implementations of all models within this context::
+
+        with utils.kernels.disabled():
+            model.predict()
+    """
+    global _enabled
+    previous = _enabled
+    _enabled = False
+    try:
+        yield
+    finally:
+        _enabled = previous
+
+
+def available():
+    """True if numba is installed and kernels have not been disabled"""
+    return _enabled and NUMBA_AVAILABLE
+
+
+def use_kernels(temperature, *parameters):
+    """True if the compiled kernels can be used for this model run.
+
+    Kernels are for single parameter sets, or for the 1D arrays of
+    candidate parameter sets used in vectorized fitting. In the latter
+    case temperature has a trailing axis of length 1 which the candidates
+    are broadcast along, see BaseModel._scipy_error_vectorized().
+    """
+    if not available():
+        return False
+    parameter_ndims = set(np.ndim(p) for p in parameters)
+    if parameter_ndims == {0}:
+        return True
+    return parameter_ndims <= {0, 1} and temperature.shape[-1] == 1
+
+
+def _as_2d(temperature):
+    """Collapse any spatial axes so the temperature array is (doy, obs)"""
+    return temperature.reshape(temperature.shape[0], -1)
+
+
+def _run_kernel(kernel, temperature, doy_series, parameters, extra_args, non_prediction):
+    """Run a model kernel for a single parameter set, or once for every
+    candidate parameter set.
+
+    Returns
+    -------
+    doy_final : Numpy array
+        array with shape temperature.shape[1:] of the estimated doy. With
+        candidate parameter sets the trailing axis of temperature is
+        replaced with one of length n_candidates.
+    """
+    if all(np.ndim(p) == 0 for p in parameters):
+        out = _empty_estimates(temperature, doy_series, non_prediction)
+        kernel(_as_2d(temperature), doy_series, *[float(p) for p in parameters], *extra_args, out)
+        return out.reshape(temperature.shape[1:])
+
+    # The candidates share the same temperature, so drop the trailing
+    # axis they are broadcast along and run them one after another.
+    temperature = temperature[..., 0]
+    parameters = np.broadcast_arrays(*[np.asarray(p, dtype=np.float64) for p in parameters])
+    n_candidates = len(parameters[0])
+    out = np.empty((n_candidates, int(np.prod(temperature.shape[1:]))), dtype=doy_series.dtype)
+    for i in range(n_candidates):
+        out[i] = non_prediction
+        kernel(_as_2d(temperature), doy_series, *[p[i] for p in parameters], *extra_args, out[i])
+    return out.T.reshape(temperature.shape[1:] + (n_candidates,))
+
+
+@njit(cache=True)
+def _first_day(doy_series, t):
+    """Index of the first day on or after doy t. Accumulation starts here,
+    so the days before it can be skipped entirely."""
+    return np.searchsorted(doy_series, t)
+
+
+def _empty_estimates(temperature, doy_series, non_prediction):
+    """1D doy estimates for each obs, kernels overwrite where the event happens"""
+    n_obs = int(np.prod(temperature.shape[1:]))
+    return np.full(n_obs, non_prediction, dtype=doy_series.dtype)
+
+
+@njit(cache=True)
+def _alternating_kernel(temperature, doy_series, a, b, c, threshold, t1, zero, out):
+    n_days, n_obs = temperature.shape
+    # Nothing accumulates before t1, so if the event happens with
+    # nothing accumulated it happens on the first day.
+    start = _first_day(doy_series, t1)
+    if start > 0 and a + b <= 0:
+        out[:] = doy_series[0]
+        return
+    for j in range(n_obs):
+        chill_days = 0.0
+        # gdd is summed in the dtype of temperature, as in the numpy
+        # implementation, so exact ties with the chill day curve agree.
+        gdd = zero
+        for i in range(start, n_days):
+            if temperature[i, j] < threshold:
+                chill_days += 1
+            else:
+                gdd += temperature[i, j]
+            if gdd - (a + b * np.exp(c * chill_days)) >= 0:
+                out[j] = doy_series[i]
+                break
+
+
+def alternating(temperature, doy_series, a, b, c, threshold, t1, non_prediction=999):
+    """Alternating model in a single pass.
+
+    Equivalent to Alternating._apply_model(), see that for details.
+
+    Returns
+    -------
+    doy_final : Numpy array
+        see _run_kernel()
+    """
+    return _run_kernel(_alternating_kernel, temperature, doy_series,
+                       parameters=(a, b, c, threshold, t1),
+                       extra_args=(temperature.dtype.type(0),),
+                       non_prediction=non_prediction)
+
+
+@njit(cache=True)
+def _uniforc_kernel(temperature, doy_series, t1, F, b, c, out):
+    n_days, n_obs = temperature.shape
+    start = _first_day(doy_series, t1)
+    if start > 0 and F <= 0:
+        out[:] = doy_series[0]
+        return
+    for j in range(n_obs):
+        forcing = 0.0
+        for i in range(start, n_days):
+            forcing += 1.0 / (1.0 + np.exp(b * (temperature[i, j] - c)))
+            if forcing >= F:
+                out[j] = doy_series[i]
+                break
+
+
+def uniforc(temperature, doy_series, t1, F, b, c, non_prediction=999):
+    """Uniforc model in a single pass.
+
+    Equivalent to Uniforc._apply_model(), see that for details.
+
+    Returns
+    -------
+    doy_final : Numpy array
+        see _run_kernel()
+    """
+    return _run_kernel(_uniforc_kernel, temperature, doy_series,
+                       parameters=(t1, F, b, c),
+                       extra_args=(),
+                       non_prediction=non_prediction)
+
+
+@njit(cache=True)
+def _unichill_kernel(temperature, doy_series, t0, C, F, b_f, c_f, a_c, b_c, c_c, out):
+    n_days, n_obs = temperature.shape
+    # With a positive chilling requirement neither chilling nor forcing
+    # accumulate before t0. Otherwise forcing may start on the first day.
+    start = _first_day(doy_series, t0) if C > 0 else 0
+    if start > 0 and F <= 0:
+        out[:] = doy_series[0]
+        return
+    for j in range(n_obs):
+        chilling = 0.0
+        forcing = 0.0
+        for i in range(start, n_days):
+            t = temperature[i, j]
+            if doy_series[i] >= t0:
+                chilling += 1.0 / (1.0 + np.exp(a_c * (t - c_c)**2 + b_c * (t - c_c)))
+            # Written this way, instead of chilling >= C, to match the
+            # numpy implementation when chilling is nan.
+            if not chilling < C:
+                forcing += 1.0 / (1.0 + np.exp(b_f * (t - c_f)))
+            if forcing >= F:
+                out[j] = doy_series[i]
+                break
+
+
+def unichill(temperature, doy_series, t0, C, F, b_f, c_f, a_c, b_c, c_c, non_prediction=999):
+    """Unichill model in a single pass.
+
+    Equivalent to Unichill._apply_model(), see that for details.
+
+    Returns
+    -------
+    doy_final : Numpy array
+        see _run_kernel()
+    """
+    return _run_kernel(_unichill_kernel, temperature, doy_series,
+                       parameters=(t0, C, F, b_f, c_f, a_c, b_c, c_c),
+                       extra_args=(),
+                       non_prediction=non_prediction)
+
+
+@njit(cache=True)
+def _triangle_response_kernel(temperature, t_min, t_opt, t_max, out):
+    n_days, n_obs = temperature.shape
+    for j in range(n_obs):
+        for i in range(n_days):
+            t = temperature[i, j]
+            if t <= t_min or t >= t_max:
+                out[i, j] = 0
+            elif t <= t_opt:
+                # Stored before dividing, as in the numpy implementation
+                # which works in place on an array of the same dtype.
+                out[i, j] = t - t_min
+                out[i, j] = out[i, j] / (t_opt - t_min)
+            elif t < t_max:
+                out[i, j] = t - t_max
+                out[i, j] = out[i, j] / (t_opt - t_max)
+            else:
+                # nan
+                out[i, j] = t
+
+
+def triangle_response(temperature, t_min, t_opt, t_max):
+    """Triangle response in a single pass.
+
+    Equivalent to utils.transforms.triangle_response(), but does not modify
+    temperature.
+
+    Returns
+    -------
+    response : Numpy array
+        array the same shape and dtype as temperature
+    """
+    temperature_2d = _as_2d(temperature)
+    out = np.empty_like(temperature_2d)
+    _triangle_response_kernel(temperature_2d, float(t_min), float(t_opt), float(t_max), out)
+    return out.reshape(temperature.shape)
+
+
+@njit(cache=True)
+def _sum_of_squares_kernel(obs, pred):
+    total = 0.0
+    for i in range(obs.shape[0]):
+        residual = obs[i] - pred[i]
+        total += residual * residual
+    return total
+
+
+def mean_squared_error(obs, pred):
+    """Mean squared error of two 1D arrays of the same length, without
+    allocating the residuals.
+
+    Equivalent to utils.optimize.mean_squared_error() for a single candidate.
+    """
+    return _sum_of_squares_kernel(obs, pred) / obs.shape[0]
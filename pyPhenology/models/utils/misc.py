@@ -1,7 +1,124 @@
+import numpy as np
+import pandas as pd
 import json
 import os
+from contextlib import contextmanager
 from warnings import warn
 
+# Pivoted temperature data, keyed by the id of the predictors data frame,
+# while inside cached_temperature_pivot()
+_pivot_cache = None
+
+
+@contextmanager
+def cached_temperature_pivot():
+    """Reuse the pivoted temperature data for predictors already seen.
+
+    Within this context temperature_only_data_prep() pivots each predictors
+    data frame only once. This is used when many models are fit or make
+    predictions with the same predictors, such as in a BootstrapModel.
+    The predictors must not be modified within the context.
+
+    The cache only exists in the current process. Models fit or predicted
+    by joblib workers (ie. n_jobs > 1) do not see it, and each one pivots
+    its own copy of the predictors.
+    """
+    global _pivot_cache
+    if _pivot_cache is not None:
+        # Already within an outer context, which will clear the cache
+        yield
+        return
+
+    _pivot_cache = {}
+    try:
+        yield
+    finally:
+        _pivot_cache = None
+
+
+def pivot_temperature(predictors):
+    """Pivot the temperature predictors to one row per site/year
+    and one column per doy.
+
+    Parameters
+    ----------
+    predictors : Pandas Dataframe
+        A Dataframe with columns['temperature','year','site_id', 'doy']
+
+    Returns
+    -------
+    pivoted_predictors : Pandas Dataframe
+        A Dataframe indexed by (site_id, year) with columns doy_series
+
+    doy_series : Numpy array
+        The sorted doy values used as columns
+    """
+    if _pivot_cache is not None and id(predictors) in _pivot_cache:
+        # The data frame itself is kept in the cache so its id is not reused
+        _, pivoted_predictors, doy_series = _pivot_cache[id(predictors)]
+        return pivoted_predictors, doy_series
+
+    original_predictors = predictors
+    predictors = predictors[['doy', 'site_id', 'year', 'temperature']].copy()
+    predictors = predictors.pivot_table(index=['site_id', 'year'], columns='doy', values='temperature')
+    # The pivot table columns are already the sorted unique doy values
+    doy_series = predictors.columns.to_numpy(copy=True)
+
+    # This first and last day of temperature data can causes NA issues because
+    # of leap years.If thats the case try dropping them
+    first_doy_has_na = predictors.iloc[:, 0].isna().any()
+    if first_doy_has_na:
+        first_doy_column = predictors.columns[0]
+        predictors.drop(first_doy_column, axis=1, inplace=True)
+        doy_series = doy_series[1:]
+        warn("""Dropped temperature data for doy {d} due to missing data. Most likely from leap year mismatch""".format(d=first_doy_column))
+
+    last_doy_has_na = predictors.iloc[:, -1].isna().any()
+    if last_doy_has_na:
+        last_doy_column = predictors.columns[-1]
+        predictors.drop(last_doy_column, axis=1, inplace=True)
+        doy_series = doy_series[:-1]
+        warn("""Dropped temperature data for doy {d} due to missing data. Most likely from leap year mismatch""".format(d=last_doy_column))
+
+    if _pivot_cache is not None:
+        _pivot_cache[id(original_predictors)] = (original_predictors, predictors, doy_series)
+
+    return predictors, doy_series
+
+
+def observation_temperature(observations, predictors):
+    """Give each observation a temperature time series.
+
+    This is a lookup on the (site_id, year) index of the pivoted
+    predictors, site/years not in predictors are all nan.
+
+    Parameters
+    ----------
+    observations : Pandas Dataframe
+        A data frame with columns ['year','site_id']
+
+    predictors : Pandas Dataframe
+        pivoted temperature from pivot_temperature()
+
+    Returns
+    -------
+    temperature_array : Numpy array
+        2D array with a row for each observation and a column for each doy
+    """
+    observation_keys = pd.MultiIndex.from_frame(observations[['site_id', 'year']])
+    positions = predictors.index.get_indexer(observation_keys)
+    not_found = positions < 0
+
+    # A lookup never fails outright, unlike a merge. With site_id or year as
+    # strings in one data frame and numbers in the other nothing matches.
+    if len(positions) > 0 and not_found.all():
+        raise ValueError('No observations have a site_id and year in predictors. ' +
+                         'Check that site_id and year are the same dtype in both.')
+
+    temperature_array = predictors.values[positions]
+    temperature_array[not_found] = np.nan
+    return temperature_array
+
 
 def temperature_only_data_prep(observations, predictors, for_prediction=False,
                                verbose=True):
@@ -35,7 +152,7 @@ def temperature_only_data_prep(observations, predictors, for_prediction=False,
         a 1D array of the doy of each observation
 
     temperature_array : Numpy array
-        a 2D array described above
+        a 2D float32 array described above, in Fortran order
 
     doy_series : Numpy array
         1D array with length equal to the number of columns
@@ -43,50 +160,33 @@ def temperature_only_data_prep(observations, predictors, for_prediction=False,
         (ie. doy 0 = Jan 1)
 
     """
-    predictors = predictors[['doy', 'site_id', 'year', 'temperature']].copy()
-    doy_series = predictors.doy.dropna().unique()
-    doy_series.sort()
-    predictors = predictors.pivot_table(index=['site_id', 'year'], columns='doy', values='temperature').reset_index()
-
-    # This first and last day of temperature data can causes NA issues because
-    # of leap years.If thats the case try dropping them
-    first_doy_has_na = predictors.iloc[:, 2].isna().any()  # first day will always be col 2
-    if first_doy_has_na:
-        first_doy_column = predictors.columns[2]
-        predictors.drop(first_doy_column, axis=1, inplace=True)
-        doy_series = doy_series[1:]
-        warn("""Dropped temperature data for doy {d} due to missing data. Most likely from leap year mismatch""".format(d=first_doy_column))
-
-    last_doy_index = predictors.shape[1] - 1
-    last_doy_has_na = predictors.iloc[:, last_doy_index].isna().any()
-    if last_doy_has_na:
-        last_doy_column = predictors.columns[-1]
-        predictors.drop(last_doy_column, axis=1, inplace=True)
-        doy_series = doy_series[:-1]
-        warn("""Dropped temperature data for doy {d} due to missing data. Most likely from leap year mismatch""".format(d=last_doy_column))
+    predictors, doy_series = pivot_temperature(predictors)
 
     # Dont need the doy column if it's present and prediction is being done
     if for_prediction and 'doy' in observations.columns:
         observations = observations.drop('doy', axis=1)
-    # Give each observation a temperature time series
-    obs_with_temp = observations.merge(predictors, on=['site_id', 'year'], how='left')
+    temperature_array = observation_temperature(observations, predictors)
 
     # Deal with any site/years that don't have temperature data
-    original_sample_size = len(obs_with_temp)
-    rows_with_missing_data = obs_with_temp.isnull().any(axis=1)
-    missing_info = obs_with_temp[['site_id', 'year']][rows_with_missing_data].drop_duplicates()
+    original_sample_size = len(observations)
+    rows_with_missing_data = np.isnan(temperature_array).any(axis=1) | observations.isnull().any(axis=1).values
+    missing_info = observations[['site_id', 'year']][rows_with_missing_data].drop_duplicates()
     if len(missing_info) > 0:
-        obs_with_temp.dropna(axis=0, inplace=True)
-        n_dropped = original_sample_size - len(obs_with_temp)
+        observations = observations[~rows_with_missing_data]
+        temperature_array = temperature_array[~rows_with_missing_data]
+        n_dropped = original_sample_size - len(observations)
         warn('Dropped {n0} of {n1} observations because of missing data'.format(n0=n_dropped, n1=original_sample_size) +
              '\n Missing data from: \n' + str(missing_info))
 
-    temperature_array = obs_with_temp[doy_series].values.T
+    # float32 is plenty of precision for temperature and halves the memory
+    # used in the model calculations. Models accumulate along the doy axis,
+    # so store each timeseries contiguously (Fortran order).
+    temperature_array = np.asfortranarray(temperature_array.T, dtype=np.float32)
 
     if for_prediction:
         return temperature_array, doy_series
     else:
-        observed_doy = obs_with_temp.doy.values
+        observed_doy = observations.doy.values
         return observed_doy, temperature_array, doy_series
 
 
@@ -1,11 +1,28 @@
 import numpy as np
 from scipy import optimize
+from functools import partial
+import inspect
+from . import kernels
+
+def mean_squared_error(obs, pred):
+    # This is called for every candidate during fitting, where the
+    # temporary arrays cost more than the arithmetic.
+    if kernels.available() and isinstance(obs, np.ndarray) and isinstance(pred, np.ndarray) \
+       and obs.ndim == 1 and obs.shape == pred.shape:
+        return kernels.mean_squared_error(obs, pred)
+
+    # Sum of squares along axis 0 in a single pass with einsum,
+    # instead of allocating the squared residuals and then reducing them.
+    # With obs of shape (n, 1) and pred of shape (n, S) this
+    # returns the error for all S candidates at once.
+    residuals = obs - pred
+    return np.einsum('i...,i...->...', residuals, residuals) / len(residuals)
 
 def rmse_loss(obs, pred):
-    return np.sqrt(np.mean((obs - pred)**2))
+    return np.sqrt(mean_squared_error(obs, pred))
 
 def aic_loss(obs, pred, n_param):
-    return len(obs) * np.log(np.mean((obs - pred)**2)) + 2 * (n_param + 1)
+    return len(obs) * np.log(mean_squared_error(obs, pred)) + 2 * (n_param + 1)
 
 def get_loss_function(method):
     if method == 'rmse':
@@ -15,22 +32,46 @@ def get_loss_function(method):
     else:
         raise ValueError('Unknown loss method: ' + method)
 
+# Loss functions which can evaluate many candidates in a single call.
+# See rmse_loss
+broadcastable_loss_functions = (rmse_loss,)
+
+
+def scipy_supports_vectorized():
+    """The DE vectorized option is only available in scipy 1.9 or later"""
+    return 'vectorized' in inspect.signature(optimize.differential_evolution).parameters
+
+
+def scipy_supports_sobol_init():
+    """The DE init='sobol' option is only available in scipy 1.7 or later"""
+    try:
+        from scipy.stats import qmc
+    except ImportError:
+        return False
+    return True
+
 
 def validate_optimizer_parameters(optimizer_method, optimizer_params):
+    # The DE presets skip scipy's final L-BFGS-B polish. Predictions are
+    # step functions of the parameters, so the gradient it estimates is
+    # flat almost everywhere and polishing only costs extra model runs.
     sensible_defaults = {'DE': {'testing': {'maxiter': 5,
                                             'popsize': 10,
                                             'mutation': (0.5, 1),
                                             'recombination': 0.25,
+                                            'polish': False,
                                             'disp': False},
                                 'practical': {'maxiter': 1000,
                                               'popsize': 50,
                                               'mutation': (0.5, 1),
                                               'recombination': 0.25,
+                                              'polish': False,
                                               'disp': False},
                                 'intensive': {'maxiter': 10000,
                                               'popsize': 100,
                                               'mutation': (0.1, 1),
                                               'recombination': 0.25,
+                                              'polish': False,
                                               'disp': False},
                                 },
                          'BF': {'testing': {'Ns': 2,
@@ -56,11 +97,21 @@ def validate_optimizer_parameters(optimizer_method, optimizer_params):
                                               'disp': False}}
                          }
 
+    # The DE presets start from a Sobol sequence where available. It covers
+    # the parameter space more evenly than the default latin hypercube, which
+    # matters most for models with many parameters.
+    if scipy_supports_sobol_init():
+        for preset in sensible_defaults['DE'].values():
+            preset['init'] = 'sobol'
+
     if isinstance(optimizer_params, str):
-        try:
-            optimizer_params = sensible_defaults[optimizer_method][optimizer_params]
-        except KeyError:
+        method_defaults = sensible_defaults.get(optimizer_method)
+        if method_defaults is None:
+            raise ValueError('No sensible parameters for optimizer method: ' + str(optimizer_method))
+        preset = method_defaults.get(optimizer_params)
+        if preset is None:
             raise ValueError('Unknown sensible parameter string: ' + optimizer_params)
+        optimizer_params = preset
 
     elif isinstance(optimizer_params, dict):
         pass
@@ -70,8 +121,28 @@ def validate_optimizer_parameters(optimizer_method, optimizer_params):
     return optimizer_params
 
 
+def evaluate_each_candidate(x, function_to_minimize):
+    """Evaluate a (n_parameters, S) array of candidates one at a time.
+
+    Used with the DE vectorized option when no vectorized function is available.
+    """
+    return np.array([function_to_minimize(candidate) for candidate in x.T])
+
+
+def evaluate_grid(function, grid_points, vectorized_function):
+    """A map-like callable for optimize.brute, which evaluates all grid
+    points with a single call to vectorized_function instead of calling
+    function on each of them.
+
+    Used with the BF vectorized option.
+    """
+    candidates = np.atleast_2d(np.array(list(grid_points), dtype=float).T)
+    return vectorized_function(candidates)
+
+
 def fit_parameters(function_to_minimize, bounds, method, results_translator,
-                   optimizer_params, verbose=False):
+                   optimizer_params, verbose=False, vectorized_function=None,
+                   full_output=False):
     """Internal functions to estimate model parameters. 
 
     Methods
@@ -106,8 +177,8 @@ def fit_parameters(function_to_minimize, bounds, method, results_translator,
         A minimizer function to pass to the optimizer model. Normally
         models._base_model.scipy_error
 
-    bounds : list
-        List of tuples specifying the upper and lower search space,
+    bounds : list | tuple
+        Sequence of tuples specifying the upper and lower search space,
         where each tuple represents a model parameter
 
     method : str
@@ -119,11 +190,23 @@ def fit_parameters(function_to_minimize, bounds, method, results_translator,
     optimzier_parms : dict
         parameters to pass to the scipy optimizer
 
+    vectorized_function : func, optional
+        Used in place of function_to_minimize when using DE or BF with
+        vectorized=True. It accepts a (n_parameters, S) array of S candidate
+        parameter sets and returns an array of S errors. If not set then
+        function_to_minimize is applied to each candidate in turn.
+
+    full_output : bool
+        Also return the output of the scipy optimizer
+
     Returns
     -------
     fitted_parameters : dict
         Dictionary of fitted parameters
 
+    optimize_output : OptimizeResult | tuple
+        Only if full_output is True. The output from the scipy optimizer.
+
     """
     if not isinstance(method, str):
         raise TypeError('method should be string, got ' + type(method))
@@ -132,6 +215,23 @@ def fit_parameters(function_to_minimize, bounds, method, results_translator,
         optimizer_params = validate_optimizer_parameters(optimizer_method=method,
                                                          optimizer_params=optimizer_params)
 
+        # Evaluating the population in parallel, or all at once, requires deferred
+        # updating. Set it here instead of letting scipy override it with a warning.
+        vectorized = optimizer_params.get('vectorized', False)
+        if optimizer_params.get('workers', 1) != 1 or vectorized:
+            optimizer_params = dict(optimizer_params)
+            optimizer_params.setdefault('updating', 'deferred')
+
+        if vectorized:
+            if optimizer_params.get('workers', 1) != 1:
+                raise ValueError('DE optimizer_params vectorized and workers cannot be used together')
+            if not scipy_supports_vectorized():
+                raise ValueError('DE optimizer_params vectorized requires scipy 1.9 or later')
+            if vectorized_function is None:
+                vectorized_function = partial(evaluate_each_candidate,
+                                              function_to_minimize=function_to_minimize)
+            function_to_minimize = vectorized_function
+
         optimize_output = optimize.differential_evolution(function_to_minimize,
                                                           bounds=bounds,
                                                           **optimizer_params)
@@ -142,7 +242,8 @@ def fit_parameters(function_to_minimize, bounds, method, results_translator,
                                                          optimizer_params=optimizer_params)
         # optimize.bashinhopping takes an initial guess value, so here
         # choose one randomly from the (low,high) search ranges given
-        initial_guess = [float(np.random.randint(l, h)) for l, h in bounds]
+        low, high = np.array(bounds, dtype=float).T
+        initial_guess = np.random.uniform(low, high)
 
         optimize_output = optimize.basinhopping(function_to_minimize,
                                                 x0=initial_guess,
@@ -157,6 +258,21 @@ def fit_parameters(function_to_minimize, bounds, method, results_translator,
         optimizer_params = validate_optimizer_parameters(optimizer_method=method,
                                                          optimizer_params=optimizer_params)
 
+        # brute evaluates the grid with a map-like callable when given one as
+        # workers, so use that to evaluate the whole grid at once.
+        if optimizer_params.get('vectorized', False):
+            optimizer_params = dict(optimizer_params)
+            optimizer_params.pop('vectorized')
+            if optimizer_params.get('workers', 1) != 1:
+                raise ValueError('BF optimizer_params vectorized and workers cannot be used together')
+            if 'workers' not in inspect.signature(optimize.brute).parameters:
+                raise ValueError('BF optimizer_params vectorized requires scipy 1.3 or later')
+            if vectorized_function is None:
+                vectorized_function = partial(evaluate_each_candidate,
+                                              function_to_minimize=function_to_minimize)
+            optimizer_params['workers'] = partial(evaluate_grid,
+                                                  vectorized_function=vectorized_function)
+
         # BF takes a tuple of tuples instead of a list of tuples like DE
         bounds = tuple(bounds)
 
@@ -172,4 +288,6 @@ def fit_parameters(function_to_minimize, bounds, method, results_translator,
         print('Optimizer method: {x}\n'.format(x=method))
         print('Optimizer parameters: \n {x}\n'.format(x=optimizer_params))
 
+    if full_output:
+        return fitted_parameters, optimize_output
     return fitted_parameters
@@ -2,6 +2,64 @@ import numpy as np
 from scipy.special import expit
 
 
+def broadcast_doy_series(doy_series, temperature):
+    """Reshape doy_series to broadcast along axis 0 of temperature.
+
+    Comparisons using the result, ie. doy_series < t1, can then be used
+    directly against a 2d (doy, obs) temperature array, a 3d spatial array,
+    or one with a trailing axis of candidate parameter sets added
+    during vectorized fitting.
+
+    Parameters
+    ----------
+    doy_series : Numpy array
+        1D array as produced by format_data(),
+        identifying the doy values in temperature[:,b]
+
+    temperature : Numpy array
+        array of daily temperature values
+
+    Returns
+    -------
+    doy_series : Numpy array
+        doy_series with size 1 axes added to match temperature.ndim
+    """
+    return doy_series.reshape((-1,) + (1,) * (temperature.ndim - 1))
+
+
+def zero_before_doy(array, doy_series, doy):
+    """Set all values on days before doy to 0.
+
+    With a single doy value doy_series, which is sorted, is searched for
+    the first day to keep and all earlier days are set in place with a slice.
+    When doy is an array of candidate values, as in vectorized fitting,
+    a mask is broadcast against the trailing candidate axis of array instead,
+    and a new array returned.
+
+    Parameters
+    ----------
+    array : Numpy array
+        array with the time axis as axis 0, ie. daily temperature
+        or forcing values
+
+    doy_series : Numpy array
+        1D array as produced by format_data(),
+        identifying the doy values in array[:,b]
+
+    doy : int | Numpy array
+        The first doy to keep
+
+    Returns
+    -------
+    array : Numpy array
+        array with days before doy set to 0
+    """
+    if np.ndim(doy) == 0:
+        array[:np.searchsorted(doy_series, doy)] = 0
+        return array
+    return np.where(broadcast_doy_series(doy_series, array) < doy, 0, array)
+
+
 def mean_temperature(temperature, doy_series, start_doy, end_doy):
     """Mean temperature of a single time period.
     ie. mean spring temperature.
@@ -24,31 +82,78 @@ def mean_temperature(temperature, doy_series, start_doy, end_doy):
     if start_doy > end_doy:
         raise RuntimeError('start_doy must be < end_doy')
 
-    spring_days = np.logical_and(doy_series >= start_doy, doy_series <= end_doy)
-    return temperature[spring_days].mean(axis=0)
+    # doy_series is sorted, so the period is a contiguous slice
+    first_day = np.searchsorted(doy_series, start_doy, side='left')
+    last_day = np.searchsorted(doy_series, end_doy, side='right')
+    # Accumulate in float64 so predictions do not depend on whether the
+    # temperature is stored as float32
+    return temperature[first_day:last_day].mean(axis=0, dtype=np.float64)
 
 
 def triangle_response(temperature, t_min, t_opt, t_max):
     """Triangle function
 
     Used to simulate and optimal temperature between a low and high temperature.
+    Returns a new array, temperature is not modified.
     """
     outside_triangle = np.logical_or(temperature <= t_min, temperature >= t_max)
     left_side = np.logical_and(temperature > t_min, temperature <= t_opt)
     right_side = np.logical_and(temperature > t_opt, temperature < t_max)
 
-    temperature[left_side] -= t_min
-    temperature[left_side] /= t_opt - t_min
+    response = temperature.copy()
+
+    response[left_side] -= t_min
+    response[left_side] /= t_opt - t_min
+
+    response[right_side] -= t_max
+    response[right_side] /= t_opt - t_max
+
+    # Last, since with unordered parameters this can overlap the sides
+    response[outside_triangle] = 0
+
+    return response
+
+
+def temperature_lookup(temperature):
+    """Unique values of a temperature array and where they are.
+
+    Temperature data usually has a limited precision, so there are far
+    fewer unique values than elements. Functions like sigmoid2 can then be
+    evaluated once for every unique value and the results gathered with
+    the index, which is much faster than evaluating every element.
+
+    Parameters
+    ----------
+    temperature : Numpy array
+        array of daily temperature values
+
+    Returns
+    -------
+    lookup : tuple
+        (values, index), where values is a 1D array of unique temperatures
+        and index is an array the same shape and memory order as temperature
+        such that values[index] == temperature. index uses the smallest
+        unsigned integer dtype which can hold it.
+    """
+    values, inverse = np.unique(temperature, return_inverse=True)
+    index = np.empty_like(temperature, dtype=np.min_scalar_type(max(len(values) - 1, 0)))
+    index[...] = inverse.reshape(temperature.shape)
+    return values, index
 
-    temperature[right_side] -= t_max
-    temperature[right_side] /= t_opt - t_max
 
-    temperature[outside_triangle] = 0
+def _apply_lookup(function, temperature, lookup, **parameters):
+    """Evaluate function(temperature, **parameters) using a temperature_lookup()
+    of temperature.
 
-    return temperature
+    temperature may have extra trailing axes, ie. for candidate parameter
+    sets in vectorized fitting, which the lookup values are expanded to match.
+    """
+    values, index = lookup
+    values = values.reshape((-1,) + (1,) * (temperature.ndim - index.ndim))
+    return function(values, **parameters)[index]
 
 
-def sigmoid2(temperature, b, c):
+def sigmoid2(temperature, b, c, lookup=None):
     """The two parameter sigmoid function from Chuine 2000
 
     The full equation is f(x) = 1 / (1 + exp(b*(temp -c)))
@@ -69,15 +174,24 @@ def sigmoid2(temperature, b, c):
     c : int
         Sigmoid fitting parameter
 
+    lookup : tuple, optional
+        output of temperature_lookup(temperature), used to evaluate
+        the function only once for each unique temperature value
+
     Returns
     -------
     temperature : Numpy array
         array of daily forcings derived from function
     """
-    return expit(-(b * (temperature.astype(np.float32) - c)))
+    if lookup is not None:
+        return _apply_lookup(sigmoid2, temperature, lookup, b=b, c=c)
+    # Written to evaluate in place where possible, this is
+    # equal to expit(-(b * (temperature - c)))
+    forcing = -b * (temperature.astype(np.float32, copy=False) - c)
+    return expit(forcing, out=forcing)
 
 
-def sigmoid3(temperature, a, b, c):
+def sigmoid3(temperature, a, b, c, lookup=None):
     """The three parameter sigmoid function from Chuine 2000
 
     The full equation is f(x) = 1 / (1 + exp(a*(temp-c)**2 +  b*(temp -c)))
@@ -101,12 +215,20 @@ def sigmoid3(temperature, a, b, c):
     b : int
         Sigmoid fitting parameter
 
+    lookup : tuple, optional
+        output of temperature_lookup(temperature), used to evaluate
+        the function only once for each unique temperature value
+
     Returns
     -------
     temperature : Numpy array
         array of daily forcings derived from function
     """
-    return expit(-(a * ((temperature.astype(np.float32) - c)**2) + b * (temperature.astype(np.float32) - c)))
+    if lookup is not None:
+        return _apply_lookup(sigmoid3, temperature, lookup, a=a, b=b, c=c)
+    temperature = temperature.astype(np.float32, copy=False) - c
+    chilling = -(a * (temperature**2) + b * temperature)
+    return expit(chilling, out=chilling)
 
 
 def daylength(doy, latitude):
@@ -118,19 +240,14 @@ def daylength(doy, latitude):
     assert isinstance(latitude, np.ndarray), 'latitude should be np array'
     assert doy.shape == latitude.shape, 'latitude and doy should be equal lengths'
     assert len(doy.shape) == 1, 'doy should be 1 dimensional'
-    doy = doy.copy()
-    latitude = latitude.copy()
-
     # negative doy values used in pyPhenology should be converted back to
-    # positive for daylength calculation
-    doy[doy < 1] += 365
+    # positive for daylength calculation. Also correct for winter solstice.
+    # Both are done out of place, so doy and latitude are not modified.
+    doy = np.where(doy < 1, doy + 365, doy) + 11
 
     # set constants
     latitude = (np.pi / 180) * latitude
 
-    # Correct for winter solstice
-    doy += 11
-
     # earths ecliptic
     j = np.pi / 182.625
     axis = (np.pi / 180) * 23.439
@@ -138,8 +255,7 @@ def daylength(doy, latitude):
     m = 1 - np.tan(latitude) * np.tan(axis * np.cos(j * doy))
 
     # sun never appears or disappears
-    m = np.maximum(m, 0)
-    m = np.minimum(m, 2)
+    np.clip(m, 0, 2, out=m)
 
     # Exposed fraction of the sun's circle
     b = np.arccos(1 - m) / np.pi
@@ -153,8 +269,12 @@ def daylength(doy, latitude):
 def forcing_accumulator(temperature):
     """ The accumulated forcing for each observation
     and doy in the (obs, doy) array.
+
+    The sum is done in place to avoid allocating another array
+    the size of temperature, so temperature is modified. Pass a copy
+    if the original values are still needed.
     """
-    return temperature.cumsum(axis=0)
+    return np.cumsum(temperature, axis=0, out=temperature)
 
 
 def doy_estimator(forcing, doy_series, threshold, non_prediction=999):
@@ -190,16 +310,19 @@ def doy_estimator(forcing, doy_series, threshold, non_prediction=999):
         1D array of length obs with the doy values which
         first meet the threshold
     """
-    # If threshold is not met for a particular row, ensure that a large doy
-    # gets returned so it produces a large error
-    non_prediction_buffer = np.expand_dims(np.zeros_like(forcing[0]), axis=0)
-    non_prediction_buffer[:] = 10e5
-    forcing = np.concatenate((forcing, non_prediction_buffer), axis=0)
-    doy_series = np.append(doy_series, non_prediction)
+    threshold_met = forcing >= threshold
 
     # The index of the doy for each element where F was met
-    doy_with_threshold_met = np.argmax(forcing >= threshold, axis=0)
+    doy_with_threshold_met = np.argmax(threshold_met, axis=0)
+
+    # argmax is 0 both where F was met on the first day and where it was
+    # never met. In the latter case ensure that a large doy gets returned
+    # so it produces a large error.
+    never_met = ~np.take_along_axis(threshold_met, doy_with_threshold_met[np.newaxis], axis=0)[0]
 
+    # np.where rather than assigning in place, since with 1D forcing
+    # these are scalars.
     doy_final = np.take(doy_series, doy_with_threshold_met)
+    doy_final = np.where(never_met, non_prediction, doy_final)
 
     return doy_final
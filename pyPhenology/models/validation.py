@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 
@@ -50,6 +51,20 @@ def validate_observations(observations, for_prediction=False):
     return observations[valid_columns]
 
 
+def validate_doy_series(doy_series):
+    """ Validate the doy_series of pre-formatted predictors.
+
+    Model internals find the start of accumulation with a binary search,
+    so doy_series must be strictly increasing.
+
+    Parameters
+    ----------
+    doy_series : Numpy array
+    """
+    if np.any(np.diff(doy_series) <= 0):
+        raise ValueError('doy_series must be strictly increasing')
+
+
 def validate_model(model_class):
     required_attributes = ['_apply_model', 'all_required_parameters', '_required_data',
                            '_organize_predictors', '_validate_formatted_predictors']
@@ -1,7 +1,7 @@
+import numpy as np
 import pandas as pd
 import pkg_resources
 from . import models
-from warnings import warn
 
 
 def load_test_data(name='vaccinium', phenophase='all'):
@@ -146,38 +146,22 @@ def check_data(observations, predictors, drop_missing=True, for_prediction=False
     If observations are missing predictors data, optionally return
     a dataframe with those observations dropped.
     """
-    original_obs_columns = observations.columns.values
+    # Pivoted the same way, including dropping leap year days, as when
+    # the data is passed to a model.
+    predictors_pivoted, _ = models.utils.misc.pivot_temperature(predictors)
 
-    predictors_pivoted = predictors.pivot_table(index=['site_id', 'year'], columns='doy', values='temperature').reset_index()
+    observation_temperature = models.utils.misc.observation_temperature(observations, predictors_pivoted)
 
-    # This first and last day of temperature data can causes NA issues because
-    # of leap years.If thats the case try dropping them
-    first_doy_has_na = predictors_pivoted.iloc[:, 2].isna().any()  # first day will always be col 2
-    if first_doy_has_na:
-        first_doy_column = predictors_pivoted.columns[2]
-        predictors_pivoted.drop(first_doy_column, axis=1, inplace=True)
-        warn("""Dropped temperature data for doy {d} due to missing data. Most likely from leap year mismatch""".format(d=first_doy_column))
-
-    last_doy_index = predictors_pivoted.shape[1] - 1
-    last_doy_has_na = predictors_pivoted.iloc[:, last_doy_index].isna().any()
-    if last_doy_has_na:
-        last_doy_column = predictors_pivoted.columns[-1]
-        predictors_pivoted.drop(last_doy_column, axis=1, inplace=True)
-        warn("""Dropped temperature data for doy {d} due to missing data. Most likely from leap year mismatch""".format(d=last_doy_column))
-
-
-    observations_with_temp = observations.merge(predictors_pivoted, on=['site_id', 'year'], how='left')
-
-    original_sample_size = len(observations_with_temp)
-    rows_with_missing_data = observations_with_temp.isnull().any(axis=1)
-    missing_info = observations_with_temp[['site_id', 'year']][rows_with_missing_data].drop_duplicates()
+    original_sample_size = len(observations)
+    rows_with_missing_data = np.isnan(observation_temperature).any(axis=1) | observations.isnull().any(axis=1).values
+    missing_info = observations[['site_id', 'year']][rows_with_missing_data].drop_duplicates()
     print(len(missing_info))
     if len(missing_info) > 0 and drop_missing:
-        observations_with_temp.dropna(axis=0, inplace=True)
-        n_dropped = original_sample_size - len(observations_with_temp)
+        observations = observations.reset_index(drop=True)[~rows_with_missing_data]
+        n_dropped = original_sample_size - len(observations)
         print('Dropped {n0} of {n1} observations because of missing data'.format(n0=n_dropped, n1=original_sample_size))
         print('\n Missing data from: \n' + str(missing_info))
-        return observations_with_temp[original_obs_columns], predictors
+        return observations, predictors
     elif len(missing_info) > 0:
         print('Missing predictors values detected')
         print('\n Missing data from: \n' + str(missing_info))
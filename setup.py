@@ -88,4 +88,5 @@ setup(name=NAME,
       license=LICENCE,
       packages=find_packages(),
       include_package_data=True,
+      extras_require={'numba': ['numba>=0.45']},
       zip_safe=False)
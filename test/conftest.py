@@ -0,0 +1,17 @@
+import pytest
+import numpy as np
+
+
+@pytest.fixture
+def random_candidates():
+    """Draw random candidate parameter sets from within a model's bounds.
+
+    Returns a function of (model, n_candidates) giving an
+    (n_parameters, n_candidates) array, as passed to
+    model._scipy_error_vectorized()
+    """
+    def draw(model, n_candidates=20):
+        bounds = np.array(model._scipy_bounds())
+        rng = np.random.default_rng(1)
+        return rng.uniform(bounds[:,0], bounds[:,1], size=(n_candidates, len(bounds))).T
+    return draw
@@ -1,145 +1,181 @@
-from pyPhenology import utils
+from pyPhenology import utils, models
 import pytest
 import numpy as np
 
 obs, predictors = utils.load_test_data()
 
+# The tests check outputs and errors, not parameter estimates, so use
+# a sample of the observations to keep the many model fits quick.
+obs = obs.sample(n=50, random_state=0).reset_index(drop=True)
+predictors = predictors[predictors.year.isin(obs.year)]
+
+# A subset of observations to predict on, since some re-arranging
+# goes on internally
+obs_subset = obs[1:10]
+
 core_model_names = ['Uniforc','Unichill','ThermalTime','Alternating','MSB',
                     'Linear','Sequential','M1','Naive','FallCooling']
 
-# Setup a list of (model_name, fitted_model object)
-fitted_models = [utils.load_model(model_name)() for model_name in core_model_names]
-[model.fit(obs, predictors, optimizer_params='testing') for model in fitted_models]
+@pytest.fixture(scope='module', params=core_model_names)
+def model_name(request):
+    return request.param
 
-model_test_cases = list(zip(core_model_names, fitted_models))
+@pytest.fixture(scope='module')
+def fitted_model(model_name):
+    """Each model is fit once, the first time a test needs it.
+    Nothing is fit when the tests are collected.
+    """
+    model = utils.load_model(model_name)()
+    model.fit(obs, predictors, optimizer_params='testing')
+    return model
 
-#########################################################
+@pytest.fixture(scope='module')
+def all_parameters(fitted_model):
+    """A copy of the fitted parameters, since get_params() returns the
+    model's own dictionary
+    """
+    return dict(fitted_model.get_params())
 
-@pytest.mark.parametrize('model_name, fitted_model', model_test_cases)
-def test_predict_output_length(model_name, fitted_model):
-    """Predict output length should equal input length"""
-    
-    assert len(fitted_model.predict()) == len(obs)
+@pytest.fixture(scope='module')
+def thermal_time_model():
+    """A single fitted model for tests of the core methods"""
+    model = utils.load_model('ThermalTime')()
+    model.fit(obs, predictors, optimizer_params='testing')
+    return model
 
-@pytest.mark.parametrize('model_name, fitted_model', model_test_cases)
-def test_predict_output_length2(model_name, fitted_model):
-    """Predict output length should equal input length
-    
-    Use a subset because some re-arranging goes on internally
-    """
-    predicted = fitted_model.predict(to_predict=obs[1:10], predictors=predictors)
-    assert len(predicted) == len(obs[1:10])
+#########################################################
+
+def test_predict_output(fitted_model):
+    """Predict output should be 1D with the same length as the input"""
+    predicted = fitted_model.predict()
+    assert predicted.ndim == 1
+    assert len(predicted) == len(obs)
 
-@pytest.mark.parametrize('model_name, fitted_model', model_test_cases)
-def test_predict_output_shape(model_name, fitted_model):
-    """Predict output shape should be 1D"""
-    assert len(fitted_model.predict().shape) == 1
+    predicted = fitted_model.predict(to_predict=obs_subset, predictors=predictors)
+    assert len(predicted) == len(obs_subset)
 
-@pytest.mark.parametrize('model_name, fitted_model', model_test_cases)
-def test_score(model_name, fitted_model):
+def test_score(fitted_model):
     """Score should return a single number"""
     assert isinstance(fitted_model.score(), float)
 
-@pytest.mark.parametrize('model_name, fitted_model', model_test_cases)
-def test_score_with_new_data(model_name, fitted_model):
+def test_score_with_new_data(fitted_model):
     """Score should return a single number using a new prediction set"""
-    assert isinstance(fitted_model.score(doy_observed = obs.doy.values[1:10],
-                                         to_predict = obs[1:10],
+    assert isinstance(fitted_model.score(doy_observed = obs_subset.doy.values,
+                                         to_predict = obs_subset,
                                          predictors = predictors), float)
 
-@pytest.mark.parametrize('model_name, fitted_model', model_test_cases)
-def test_do_not_score_with_non_numpy_observed_values(model_name, fitted_model):
+def test_do_not_score_with_non_numpy_observed_values(fitted_model):
     """doy_observed argument should only be a numpy array"""
     with pytest.raises(TypeError):
-        fitted_model.score(doy_observed = list(obs.doy.values[1:10]),
-                                         to_predict = obs[1:10],
-                                         predictors = predictors)
+        fitted_model.score(doy_observed = list(obs_subset.doy.values),
+                           to_predict = obs_subset,
+                           predictors = predictors)
 
-@pytest.mark.parametrize('model_name, fitted_model', model_test_cases)
-def test_brute_force(model_name, fitted_model):
+def test_brute_force(model_name):
     """Test brute force optimization"""
     
     new_model = utils.load_model(model_name)()
     new_model.fit(obs, predictors, method='BF', optimizer_params='testing')
     assert len(new_model.predict()) == len(obs)
 
-@pytest.mark.parametrize('model_name, fitted_model', model_test_cases)
-def test_predict_with_new_data_1(model_name, fitted_model):
-    """Do not predict new data with only observations"""
-    with pytest.raises(TypeError):
-        fitted_model.predict(to_predict = obs)
+@pytest.mark.skipif(not models.utils.optimize.scipy_supports_vectorized(),
+                    reason='DE vectorized option requires scipy >= 1.9')
+def test_vectorized_differential_evolution(model_name):
+    """Test DE optimization with the whole population evaluated at once"""
+    
+    new_model = utils.load_model(model_name)()
+    new_model.fit(obs, predictors, method='DE', optimizer_params={'maxiter':5,
+                                                                  'popsize':10,
+                                                                  'vectorized':True})
+    assert len(new_model.predict()) == len(obs)
+
+def test_vectorized_error_matches(fitted_model, random_candidates):
+    """The vectorized error function should match evaluating each candidate"""
+    candidates = random_candidates(fitted_model)
+    
+    vectorized_errors = fitted_model._scipy_error_vectorized(candidates)
+    errors = [fitted_model._scipy_error(c) for c in candidates.T]
+    assert np.allclose(vectorized_errors, errors)
 
-@pytest.mark.parametrize('model_name, fitted_model', model_test_cases)
-def test_predict_with_new_data_2(model_name, fitted_model):
-    """Do not predict new data with only predictors"""
+def test_predict_does_not_modify_predictors(fitted_model):
+    """Predictors are passed to the model without copying, so they
+    must not be changed in place
+    """
+    new_predictors = fitted_model._organize_predictors(observations=obs,
+                                                       predictors=predictors,
+                                                       for_prediction=True)
+    original_predictors = {k:v.copy() for k,v in new_predictors.items()}
+    
+    fitted_model.predict(predictors=new_predictors)
+    upper_bounds = np.array(fitted_model._scipy_bounds())[:,1]
+    parameters = fitted_model._translate_scipy_parameters(upper_bounds)
+    parameters.update(fitted_model._fixed_parameters)
+    fitted_model._apply_model(**new_predictors, **parameters)
+    for k, v in original_predictors.items():
+        assert np.array_equal(new_predictors[k], v, equal_nan=True)
+
+@pytest.mark.parametrize('new_data', [{'to_predict':obs}, {'predictors':predictors}],
+                         ids=['only_observations', 'only_predictors'])
+def test_predict_with_new_data(fitted_model, new_data):
+    """Do not predict new data with only observations or only predictors"""
     with pytest.raises(TypeError):
-        fitted_model.predict(predictors=predictors)
+        fitted_model.predict(**new_data)
 
-@pytest.mark.parametrize('model_name, fitted_model', model_test_cases)
-def test_save_and_load_model_universal_loader(model_name, fitted_model):
+def test_save_and_load_model_universal_loader(fitted_model, tmp_path):
     """Load a saved model via utils.load_saved_model"""
     
-    fitted_model.save_params('model_params.json', overwrite=True)
-    loaded_model = utils.load_saved_model('model_params.json')
+    model_file = str(tmp_path / 'model_params.json')
+    fitted_model.save_params(model_file, overwrite=True)
+    loaded_model = utils.load_saved_model(model_file)
     assert fitted_model.get_params() == loaded_model.get_params()
     
-@pytest.mark.parametrize('model_name, fitted_model', model_test_cases)
-def test_save_and_load_model(model_name, fitted_model):
+def test_save_and_load_model(model_name, fitted_model, tmp_path):
     """Load a saved model by passing file as parameters arg"""
 
-    fitted_model.save_params('model_params.json', overwrite=True)
-    loaded_model = utils.load_model(model_name)(parameters='model_params.json')
+    model_file = str(tmp_path / 'model_params.json')
+    fitted_model.save_params(model_file, overwrite=True)
+    loaded_model = utils.load_model(model_name)(parameters=model_file)
     assert fitted_model.get_params() == loaded_model.get_params()
 
-@pytest.mark.parametrize('model_name, fitted_model', model_test_cases)
-def test_all_parameters_fixed_fit(model_name, fitted_model):
+def test_all_parameters_fixed_fit(model_name, all_parameters):
     """Do not attempt to fit a model when all passed parameters are fixed"""
-    all_parameters = fitted_model.get_params()
     new_model = utils.load_model(model_name)(parameters=all_parameters)
     with pytest.raises(RuntimeError):
         new_model.fit(obs, predictors, optimizer_params='testing', debug=True)
         
-@pytest.mark.parametrize('model_name, fitted_model', model_test_cases)
-def test_all_parameters_fixed_predict_no_new_data(model_name, fitted_model):
+def test_all_parameters_fixed_predict_no_new_data(model_name, all_parameters):
     """Do not predict, sans new data, when all passed parameters were fixed.
     
     This only works when the model object had fit run, and predictions
     can be from the fitted data.
     """    
-    all_parameters = fitted_model.get_params()
     new_model = utils.load_model(model_name)(parameters=all_parameters)
     with pytest.raises(TypeError):
         new_model.predict()
         
-@pytest.mark.parametrize('model_name, fitted_model', model_test_cases)
-def test_all_parameters_fixed_predict_new_data(model_name, fitted_model):
+def test_all_parameters_fixed_predict_new_data(model_name, all_parameters):
     """Predict , with new data, when all passed parameters were fixed"""    
-    all_parameters = fitted_model.get_params()
     new_model = utils.load_model(model_name)(parameters=all_parameters)
     assert len(new_model.predict(obs, predictors)) == len(obs)
 
-@pytest.mark.parametrize('model_name, fitted_model', model_test_cases)
-def test_estimate_all_but_one_parameter(model_name, fitted_model):
+def test_estimate_all_but_one_parameter(model_name, all_parameters):
     """Estimate only a single parameter.
     
     The end result should be the same as what as passed
     """    
-    all_parameters = fitted_model.get_params()
-    fixed_param, fixed_value = all_parameters.popitem()
+    fixed_param, fixed_value = list(all_parameters.items())[-1]
     new_model = utils.load_model(model_name)(parameters={fixed_param:fixed_value})
     new_model.fit(obs, predictors, optimizer_params='testing', debug=True)
     new_value = new_model.get_params()[fixed_param]
     
     assert new_value == fixed_value
 
-@pytest.mark.parametrize('model_name, fitted_model', model_test_cases)
-def test_error_on_bad_parameter_names(model_name, fitted_model):
+def test_error_on_bad_parameter_names(model_name):
     """Expect error when unknown parameter name is used"""
     with pytest.raises(RuntimeError):
         utils.load_model(model_name)(parameters={'not_a_parameter':0})
         
-@pytest.mark.parametrize('model_name, fitted_model', model_test_cases)
-def test_do_not_predict_wihout_fit(model_name, fitted_model):
+def test_do_not_predict_wihout_fit(model_name):
     """Do not predict on unfitted model"""
     model = utils.load_model(model_name)()
     with pytest.raises(RuntimeError):
@@ -149,33 +185,76 @@ def test_do_not_predict_wihout_fit(model_name, fitted_model):
 # These tests are for the core methods and do not need to be run 
 # for all model types
         
-def test_predict_with_nan():
+def test_predict_with_nan(thermal_time_model):
     """model.predict() method should work with nan in obs.doy
     column. see https://github.com/sdtaylor/pyPhenology/issues/105
     """
-    single_model = utils.load_model('ThermalTime')()
-    single_model.fit(obs, predictors, optimizer_params='testing')
+    obs_with_nan = obs.assign(doy=np.nan)
+    p_with_nan = thermal_time_model.predict(obs_with_nan, predictors)
+    p = thermal_time_model.predict(obs, predictors)
+
+    assert np.array_equal(p, p_with_nan, equal_nan=True)
+
+def test_parameter_value_types():
+    """Fixed parameters can be any real number, anything else is an error"""
+    model = utils.load_model('ThermalTime')(parameters={'t1':1, 'T':np.float32(5), 'F':np.int64(200)})
+    assert model._parameters_are_set()
+    with pytest.raises(TypeError):
+        utils.load_model('ThermalTime')(parameters={'t1':'1'})
 
-    obs_with_nan = obs.copy(deep=True)
-    obs_with_nan['doy'] = np.nan
-    p_with_nan = single_model.predict(obs_with_nan, predictors)
-    p = single_model.predict(obs, predictors)
+def test_debug_fit_catches_modified_temperature():
+    """With debug on, a model which modifies the temperature array
+    in place should fail instead of silently changing it for every
+    following candidate.
+    """
+    class ModifyingThermalTime(models.ThermalTime):
+        def _apply_model(self, temperature, doy_series, t1, T, F):
+            temperature[temperature < T] = 0
+            return super()._apply_model(temperature, doy_series, t1, T, F)
 
-    assert np.all(p==p_with_nan)
+    # newer scipy versions re-raise the ValueError as a RuntimeError
+    with pytest.raises((ValueError, RuntimeError)):
+        ModifyingThermalTime().fit(obs, predictors, optimizer_params='testing', debug=True)
 
-def test_no_nan_in_observations_fit():
+def test_vectorized_error_matches_with_fixed_parameters(random_candidates):
+    """Vectorized errors should also match when only some
+    parameters, including the start day, are estimated
+    """
+    model = utils.load_model('Uniforc')(parameters={'b':-2, 'c':5})
+    model.fit(obs, predictors, optimizer_params='testing')
+    candidates = random_candidates(model)
+    
+    with models.utils.kernels.disabled():
+        vectorized_errors = model._scipy_error_vectorized(candidates)
+        errors = [model._scipy_error(c) for c in candidates.T]
+    assert np.allclose(vectorized_errors, errors)
+
+def test_no_nan_in_observations_fit(thermal_time_model):
     """the observation data.frame, either in fitting or prediction,
     should not have any NA
     
     """
-    single_model = utils.load_model('ThermalTime')()
-    single_model.fit(obs, predictors, optimizer_params='testing')
-
-    obs_with_nan = obs.copy(deep=True)
-    obs_with_nan['year'][1] = np.nan
+    years = obs.year.to_numpy(dtype=float, copy=True)
+    years[1] = np.nan
+    obs_with_nan = obs.assign(year=years)
     
     with pytest.raises(ValueError):
-        single_model.predict(obs_with_nan, predictors)
+        thermal_time_model.predict(obs_with_nan, predictors)
+
+def test_error_on_mismatched_site_id_dtype(thermal_time_model):
+    """Observations which can't match any predictors because of a
+    different site_id dtype should be an error, not all dropped
+    """
+    obs_with_str_site_id = obs.astype({'site_id':str})
+    with pytest.raises(ValueError):
+        thermal_time_model.predict(obs_with_str_site_id, predictors)
+
+def test_error_on_unsorted_doy_series(thermal_time_model):
+    """Pre-formatted predictors must have an increasing doy_series"""
+    unsorted_predictors = dict(thermal_time_model.fitting_predictors)
+    unsorted_predictors['doy_series'] = unsorted_predictors['doy_series'][::-1]
+    with pytest.raises(ValueError):
+        thermal_time_model.predict(predictors=unsorted_predictors)
 
 def test_no_nan_in_observations_predict():
     """the observation data.frame, either in fitting or prediction,
@@ -184,9 +263,30 @@ def test_no_nan_in_observations_predict():
     """
     single_model = utils.load_model('ThermalTime')()
 
-    obs_with_nan = obs.copy(deep=True)
-    obs_with_nan['doy'][1] = np.nan
+    doys = obs.doy.to_numpy(dtype=float, copy=True)
+    doys[1] = np.nan
+    obs_with_nan = obs.assign(doy=doys)
     
     with pytest.raises(ValueError):
         single_model.fit(obs_with_nan, predictors, optimizer_params='testing')
     
+
+def test_unichill_spatial_predict():
+    """Unichill should predict on 3d (spatial) temperature arrays the
+    same as on 2d arrays
+    """
+    single_model = utils.load_model('Unichill')()
+    single_model.fit(obs, predictors, optimizer_params='testing')
+    
+    temperature = single_model.fitting_predictors['temperature']
+    doy_series = single_model.fitting_predictors['doy_series']
+    spatial_temperature = np.stack([temperature, temperature[:, ::-1]], axis=2)
+    spatial_predictors = {'temperature':spatial_temperature, 'doy_series':doy_series}
+    p_spatial = single_model.predict(predictors=spatial_predictors)
+    with models.utils.kernels.disabled():
+        p_spatial_numpy = single_model.predict(predictors=spatial_predictors)
+    
+    assert p_spatial.shape == spatial_temperature.shape[1:]
+    assert np.all(p_spatial[:, 0] == single_model.predict())
+    assert np.all(p_spatial[:, 1] == single_model.predict()[::-1])
+    assert np.all(p_spatial == p_spatial_numpy)
@@ -108,33 +108,37 @@ def test_ensemble_score(model_name, fitted_model):
     assert isinstance(fitted_model.score(), float)
 
 @pytest.mark.parametrize('model_name, fitted_model', test_cases)
-def test_ensemble_parameters(model_name, fitted_model):
+def test_ensemble_parameters(model_name, fitted_model, tmp_path):
     """Parameters should be the same when loaded again"""
-    fitted_model.save_params('model_params.json', overwrite=True)
-    loaded_model = utils.load_saved_model('model_params.json')
+    model_file = str(tmp_path / 'model_params.json')
+    fitted_model.save_params(model_file, overwrite=True)
+    loaded_model = utils.load_saved_model(model_file)
     assert loaded_model.get_params() == fitted_model.get_params()
 
 @pytest.mark.parametrize('model_name, fitted_model', test_cases)
-def test_ensemble_save_load(model_name, fitted_model):
+def test_ensemble_save_load(model_name, fitted_model, tmp_path):
     """"Save and load a model"""
-    fitted_model.save_params('model_params.json', overwrite=True)
-    loaded_model = utils.load_saved_model('model_params.json')
+    model_file = str(tmp_path / 'model_params.json')
+    fitted_model.save_params(model_file, overwrite=True)
+    loaded_model = utils.load_saved_model(model_file)
     assert len(loaded_model.predict(obs, predictors)) == len(obs)
 
 @pytest.mark.parametrize('model_name, fitted_model', test_cases)
-def test_ensemble_do_not_predict_without_data(model_name, fitted_model):
+def test_ensemble_do_not_predict_without_data(model_name, fitted_model, tmp_path):
     """Should not predict when no fitting was done and no new data passed """
-    fitted_model.save_params('model_params.json', overwrite=True)
-    loaded_model = utils.load_saved_model('model_params.json')
+    model_file = str(tmp_path / 'model_params.json')
+    fitted_model.save_params(model_file, overwrite=True)
+    loaded_model = utils.load_saved_model(model_file)
     with pytest.raises(TypeError):
         loaded_model.predict()
 
 @pytest.mark.parametrize('model_name, fitted_model', test_cases)
-def test_ensemble_prediction_is_stable_after_saving(model_name, fitted_model):
+def test_ensemble_prediction_is_stable_after_saving(model_name, fitted_model, tmp_path):
     """Predictions shouldn't change after the model is saved and re-loaded"""
     predictions1 = fitted_model.predict()
-    fitted_model.save_params('model_params.json', overwrite=True)
-    loaded_model = utils.load_saved_model('model_params.json')
+    model_file = str(tmp_path / 'model_params.json')
+    fitted_model.save_params(model_file, overwrite=True)
+    loaded_model = utils.load_saved_model(model_file)
     predictions2 = loaded_model.predict(to_predict = obs, predictors=predictors)
     assert np.all(predictions1 == predictions2)
 
@@ -157,3 +161,21 @@ def test_WeightedEnsemble_weight_shape():
 def test_WeightedEnsemble_weight_shape2():
     """Array of mean fitted weights should be this shape"""
     assert weighted_model.weights.shape==(len_core_models,)
+
+def test_bootstrap_shares_workers_pool(monkeypatch):
+    """With DE workers all bootstraps should be fit using a single pool"""
+    created_pools = []
+    class FakePool():
+        def __init__(self, processes):
+            created_pools.append(processes)
+            self.map = map
+        def __enter__(self):
+            return self
+        def __exit__(self, *args):
+            pass
+    monkeypatch.setattr(models.ensemble_models, 'Pool', FakePool)
+    
+    model = models.BootstrapModel(core_model=models.ThermalTime, num_bootstraps=3)
+    model.fit(obs, predictors, optimizer_params={'maxiter':5, 'popsize':10, 'workers':2})
+    assert created_pools == [2]
+    assert model.predict().shape == (len(obs),)
@@ -1,6 +1,7 @@
 from pyPhenology import utils, models
 import pytest
 import numpy as np
+import pandas as pd
 
 obs, predictors = utils.load_test_data()
 Model = utils.load_model('ThermalTime')
@@ -13,10 +14,92 @@ def test_basinhopping_method():
     model.fit(obs, predictors, method='BH', optimizer_params='testing')
     assert len(model.predict()) == len(obs)
     
+def test_basinhopping_narrow_bounds():
+    """The initial guess should be drawn from within bounds narrower than 1"""
+    narrow_model = Model(parameters={'t1': 1, 'T': (0.1, 0.9)})
+    narrow_model.fit(obs, predictors, method='BH', optimizer_params={'niter': 2})
+    assert len(narrow_model.predict()) == len(obs)
+
+def test_differential_evolution_workers(monkeypatch):
+    """Using DE workers should pass updating='deferred' to scipy"""
+    passed_params = {}
+    def fake_differential_evolution(func, bounds, **kwargs):
+        passed_params.update(kwargs)
+        return {'x': np.array([np.mean(b) for b in bounds])}
+    monkeypatch.setattr(models.utils.optimize.optimize, 'differential_evolution',
+                        fake_differential_evolution)
+
+    workers_model = utils.load_model('ThermalTime')()
+    workers_model.fit(obs, predictors, method='DE', optimizer_params={'maxiter':5,
+                                                                      'popsize':10,
+                                                                      'workers':2})
+    assert passed_params['workers'] == 2
+    assert passed_params['updating'] == 'deferred'
+
+def test_differential_evolution_vectorized_and_workers():
+    """DE vectorized and workers options are mutually exclusive"""
+    vectorized_model = utils.load_model('ThermalTime')()
+    with pytest.raises(ValueError):
+        vectorized_model.fit(obs, predictors, method='DE', optimizer_params={'maxiter':5,
+                                                                             'popsize':10,
+                                                                             'vectorized':True,
+                                                                             'workers':2})
+
+def test_differential_evolution_warm_start(monkeypatch):
+    """A warm started fit should pass the previous DE population to scipy"""
+    warm_model = utils.load_model('ThermalTime')()
+    warm_model.fit(obs, predictors, optimizer_params='testing')
+    last_population = warm_model._last_population
+    if last_population is None:
+        pytest.skip('scipy does not return the final DE population')
+    assert last_population.shape[1] == len(warm_model._parameters_to_estimate)
+    
+    passed_params = {}
+    differential_evolution = models.utils.optimize.optimize.differential_evolution
+    def recording_differential_evolution(func, bounds, **kwargs):
+        passed_params.update(kwargs)
+        return differential_evolution(func, bounds, **kwargs)
+    monkeypatch.setattr(models.utils.optimize.optimize, 'differential_evolution',
+                        recording_differential_evolution)
+
+    warm_model.fit(obs, predictors, optimizer_params='testing', warm_start=True)
+    assert passed_params['init'] is last_population
+    assert len(warm_model.predict()) == len(obs)
+
+def test_differential_evolution_warm_start_without_population():
+    """warm_start with nothing to start from should warn, not fail"""
+    cold_model = utils.load_model('ThermalTime')()
+    with pytest.warns(UserWarning, match='warm_start'):
+        cold_model.fit(obs, predictors, optimizer_params='testing', warm_start=True)
+    assert len(cold_model.predict()) == len(obs)
+
 def test_bruteforce_method():
     model.fit(obs, predictors, method='BF', optimizer_params='testing')
     assert len(model.predict()) == len(obs)
 
+def test_bruteforce_vectorized():
+    """Evaluating the grid in a single call should give the same parameters"""
+    optimizer_params = {'Ns': 5, 'finish': None}
+    grid_model = models.ThermalTime(parameters={'t1': 1})
+    grid_model.fit(obs, predictors, method='BF', optimizer_params=optimizer_params)
+    vectorized_model = models.ThermalTime(parameters={'t1': 1})
+    vectorized_model.fit(obs, predictors, method='BF',
+                         optimizer_params=dict(optimizer_params, vectorized=True))
+    assert grid_model.get_params() == vectorized_model.get_params()
+
+def test_check_data_drops_missing():
+    """check_data should drop observations without predictors, with the
+    index reset, and raise when none match
+    """
+    missing_site_obs = obs.set_index(obs.index + 100)
+    missing_site_obs.loc[[100, 105], 'site_id'] = 999
+    checked_obs, _ = utils.check_data(missing_site_obs, predictors)
+    assert len(checked_obs) == len(obs) - 2
+    assert checked_obs.index.equals(pd.RangeIndex(len(obs)).drop([0, 5]))
+    
+    with pytest.raises(ValueError):
+        utils.check_data(obs.astype({'site_id':str}), predictors)
+
 def test_daylength_util():
     """daylength equation from julian day & latitude.
     
@@ -25,3 +108,102 @@ def test_daylength_util():
     d = models.utils.transforms.daylength(np.array([30,90,180]), np.array([20,30,40]))
     np
     assert np.all(np.round(d,1) == np.array([ 11.1 ,  12.3 ,  14.8]))
+
+def test_doy_estimator():
+    """The first doy where the threshold is met, or the non-prediction
+    value where it never is, including when it is met on the first day.
+    """
+    forcing = np.array([[5, 0, 0],
+                        [6, 1, 0],
+                        [7, 2, 0]]).cumsum(axis=0)
+    doy_series = np.array([10, 11, 12])
+    d = models.utils.transforms.doy_estimator(forcing, doy_series, threshold=3)
+    assert np.all(d == np.array([10, 12, 999]))
+    
+    # A single 1D timeseries
+    assert models.utils.transforms.doy_estimator(forcing[:, 1], doy_series, threshold=3) == 12
+    assert models.utils.transforms.doy_estimator(forcing[:, 2], doy_series, threshold=3) == 999
+
+def test_sigmoid_temperature_lookup():
+    """sigmoid functions should give the same result when evaluated
+    with a temperature lookup, including with candidate parameter arrays
+    """
+    transforms = models.utils.transforms
+    temperature = np.round(np.random.default_rng(1).normal(10, 8, size=(50, 20)), 1).astype(np.float32)
+    temperature = np.asfortranarray(temperature)
+    lookup = transforms.temperature_lookup(temperature)
+    assert lookup[1].dtype == np.uint16
+    assert lookup[1].flags.f_contiguous
+    b = np.array([-1., -5., -0.5])
+    c = np.array([0., 10., 4.])
+    
+    assert np.array_equal(transforms.sigmoid2(temperature, b=-2, c=5, lookup=lookup),
+                          transforms.sigmoid2(temperature, b=-2, c=5))
+    assert np.array_equal(transforms.sigmoid3(temperature[..., None], a=0.1, b=b, c=c, lookup=lookup),
+                          transforms.sigmoid3(temperature[..., None], a=0.1, b=b, c=c))
+
+def test_temperature_lookup_only_without_kernels():
+    """The temperature lookup is only built when the numpy
+    implementations will be used in fitting
+    """
+    pytest.importorskip('numba')
+    lookup_model = utils.load_model('Uniforc')()
+    lookup_model.fit(obs, predictors, optimizer_params='testing')
+    assert 'temperature_lookup' not in lookup_model.fitting_predictors
+    
+    with models.utils.kernels.disabled():
+        lookup_model.fit(obs, predictors, optimizer_params='testing')
+    assert 'temperature_lookup' in lookup_model.fitting_predictors
+
+@pytest.mark.parametrize('model_name', ['Alternating', 'Uniforc', 'Unichill', 'Sequential'])
+def test_kernels_match_numpy(model_name):
+    """Compiled kernels should give the same predictions as the numpy models"""
+    pytest.importorskip('numba')
+    kernel_model = utils.load_model(model_name)()
+    kernel_model.fit(obs, predictors, optimizer_params='testing')
+    
+    with models.utils.kernels.disabled():
+        numpy_predictions = kernel_model.predict()
+    
+    assert np.all(kernel_model.predict() == numpy_predictions)
+
+@pytest.mark.parametrize('model_name', ['Alternating', 'Uniforc', 'Unichill'])
+def test_kernels_match_numpy_vectorized(model_name, random_candidates):
+    """Compiled kernels should also match the numpy models when
+    evaluating many candidate parameter sets at once
+    """
+    pytest.importorskip('numba')
+    model = utils.load_model(model_name)()
+    model.fit(obs, predictors, optimizer_params='testing')
+    candidates = random_candidates(model, n_candidates=50)
+    
+    with models.utils.kernels.disabled():
+        numpy_errors = model._scipy_error_vectorized(candidates)
+    
+    assert np.all(model._scipy_error_vectorized(candidates) == numpy_errors)
+
+def test_compiled_loss_matches_numpy():
+    """The compiled mean squared error should match the numpy version"""
+    pytest.importorskip('numba')
+    rng = np.random.default_rng(1)
+    observed = rng.integers(50, 200, size=100)
+    predicted = rng.uniform(50, 200, size=100)
+    
+    with models.utils.kernels.disabled():
+        numpy_rmse = models.utils.optimize.rmse_loss(observed, predicted)
+    
+    assert np.isclose(models.utils.optimize.rmse_loss(observed, predicted), numpy_rmse)
+
+def test_cached_temperature_pivot():
+    """Within cached_temperature_pivot() predictors are only pivoted once,
+    and the data prep result is unchanged
+    """
+    misc = models.utils.misc
+    expected = misc.temperature_only_data_prep(obs, predictors)
+    with misc.cached_temperature_pivot():
+        pivoted, _ = misc.pivot_temperature(predictors)
+        assert misc.pivot_temperature(predictors)[0] is pivoted
+        result = misc.temperature_only_data_prep(obs, predictors)
+    assert misc._pivot_cache is None
+    for a, b in zip(expected, result):
+        assert np.array_equal(a, b)